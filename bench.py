@@ -0,0 +1,253 @@
+"""Benchmarks for lmdirect. Run with --help for options."""
+import argparse, asyncio, json, platform, statistics, sys, time, tracemalloc
+
+from lmdirect import LMDirect
+from lmdirect.aescipher import AESCipher
+from lmdirect.connection import checksum
+from lmdirect.msgs import MSGS, Msg
+from lmdirect.simulator import SimulatedFleet, SimulatedMachine
+from lmdirect.state import State
+
+KEY = "0123456789abcdef0123456789abcdef"
+
+"""The messages that request_status() reads."""
+STATUS_MSGS = [
+    Msg.GET_STATUS,
+    Msg.GET_CONFIG,
+    Msg.GET_AUTO_ON_OFF_TIMES,
+    Msg.GET_DRINK_STATS,
+    Msg.GET_USAGE_STATS,
+    Msg.GET_FRONT_DISPLAY,
+    Msg.GET_PREINFUSION_TIMES,
+    Msg.GET_FACTORY_CONFIG,
+]
+
+"""Metrics where a bigger number is better. For everything else, smaller is better."""
+HIGHER_IS_BETTER = ("_per_sec",)
+
+
+class NullWriter:
+    """Stands in for a StreamWriter so that framing can be measured without a socket."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+
+    async def drain(self):
+        pass
+
+
+def timeit(fn, number):
+    """Return the mean time per call in microseconds, best of 3 runs."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = (time.perf_counter() - start) / number * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def atimeit(fn, number):
+    """Return the mean time per await in microseconds, best of 3 runs."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        elapsed = (time.perf_counter() - start) / number * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def response(machine, msg_id):
+    """Return the plaintext of a simulated machine's response to a read."""
+    request = Msg.READ + MSGS[msg_id].msg
+    plaintext = machine._respond(request + checksum(request))
+    return plaintext + checksum(plaintext)
+
+
+async def micro(number):
+    results = {}
+    cipher = AESCipher(KEY)
+    machine = SimulatedMachine(KEY)
+
+    plaintext = response(machine, Msg.GET_STATUS)
+    ciphertext = cipher.encrypt(plaintext)
+    results["aes_encrypt_us"] = timeit(lambda: cipher.encrypt(plaintext), number)
+    results["aes_decrypt_us"] = timeit(lambda: cipher.decrypt(ciphertext), number)
+
+    lmdirect = LMDirect(machine.machine_info)
+    for msg_id in STATUS_MSGS + [Msg.GET_TEMP_REPORT, Msg.GET_SER_NUM]:
+        plaintext = response(machine, msg_id)
+        results[f"process_data_{msg_id}_us"] = await atimeit(
+            lambda: lmdirect.process_data(plaintext), number
+        )
+
+    """Frame and encrypt without a socket."""
+    lmdirect._connected = True
+    lmdirect._cipher = cipher
+    lmdirect._writer = NullWriter()
+    msg = MSGS[Msg.SET_COFFEE_TEMP].msg
+
+    async def send():
+        """Acknowledge each write, or the next one waits for it to time out."""
+        await lmdirect._send_raw_msg(msg, Msg.WRITE, "03A7")
+        lmdirect._acknowledge_write(msg, True)
+
+    results["send_raw_msg_us"] = await atimeit(send, number)
+    lmdirect._responses_waiting = []
+
+    return results
+
+
+async def state_bytes(count, factory):
+    """Return the bytes that each of count machines holds for its state after a status sweep."""
+    machine = SimulatedMachine(KEY)
+    frames = [response(machine, x) for x in STATUS_MSGS]
+    machines = [LMDirect(machine.machine_info) for _ in range(count)]
+
+    """The mirror and the metrics hold the same data whichever way the state is stored."""
+    ignore = [
+        tracemalloc.Filter(False, "*mirror.py"),
+        tracemalloc.Filter(False, "*metrics.py"),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ]
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces(ignore)
+    for lmdirect in machines:
+        lmdirect._current_status = factory()
+        lmdirect._key_versions = factory()
+        for plaintext in frames:
+            await lmdirect.process_data(plaintext)
+    after = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.stop()
+
+    return sum(x.size_diff for x in after.compare_to(before, "filename")) / count
+
+
+async def memory(count):
+    return {
+        "state_dict_bytes_per_machine": await state_bytes(count, dict),
+        "state_bytes_per_machine": await state_bytes(count, State),
+    }
+
+
+async def macro(sweeps, fleet_size):
+    results = {}
+
+    async with SimulatedMachine(KEY, temp_interval=None) as machine:
+        lmdirect = LMDirect(machine.machine_info)
+        latencies = []
+        for _ in range(sweeps):
+            start = time.perf_counter()
+            if not await lmdirect.refresh(STATUS_MSGS, max_age=0):
+                raise RuntimeError("Status sweep failed")
+            latencies.append((time.perf_counter() - start) * 1e3)
+        await lmdirect._close()
+
+    latencies.sort()
+    results["status_sweep_p50_ms"] = statistics.median(latencies)
+    results["status_sweep_p95_ms"] = latencies[int(len(latencies) * 0.95) - 1]
+
+    async with SimulatedFleet(fleet_size, KEY, temp_interval=None) as fleet:
+        machines = [LMDirect(x) for x in fleet.machine_info]
+
+        async def sweep(lmdirect):
+            return await lmdirect.refresh(STATUS_MSGS, max_age=0)
+
+        """The first sweep also connects."""
+        await asyncio.gather(*[sweep(x) for x in machines])
+
+        rounds = max(1, sweeps // 10)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            ok = await asyncio.gather(*[sweep(x) for x in machines])
+        elapsed = time.perf_counter() - start
+
+        for lmdirect in machines:
+            await lmdirect._close()
+
+    if not all(ok):
+        raise RuntimeError("Fleet sweep failed")
+    results["fleet_sweeps_per_sec"] = rounds * fleet_size / elapsed
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of the metrics that are more than threshold worse than the baseline."""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old or not value:
+            continue
+
+        if name.endswith(HIGHER_IS_BETTER):
+            change = old / value - 1
+        else:
+            change = value / old - 1
+
+        if change > threshold:
+            regressions.append((name, old, value, change))
+
+    return regressions
+
+
+async def run(args):
+    results = {}
+    if not args.macro_only:
+        results.update(await micro(args.number))
+    if not args.micro_only:
+        results.update(await macro(args.sweeps, args.fleet))
+    if args.memory:
+        results.update(await memory(args.fleet))
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark lmdirect.")
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--macro-only", action="store_true")
+    parser.add_argument("--number", type=int, default=2000, help="iterations per micro-benchmark")
+    parser.add_argument("--sweeps", type=int, default=100, help="status sweeps against one machine")
+    parser.add_argument("--fleet", type=int, default=200, help="simulated machines in the fleet sweep")
+    parser.add_argument("--memory", action="store_true", help="also measure the memory each machine's state takes")
+    parser.add_argument("--output", help="write the results to a JSON file")
+    parser.add_argument("--baseline", help="compare against the results in a JSON file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression, e.g. 0.10 for 10%%")
+    args = parser.parse_args(argv[1:])
+
+    results = asyncio.run(run(args))
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.3f} -> {new:.3f} ({change:+.1%})", file=sys.stderr)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
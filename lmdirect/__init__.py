@@ -1,16 +1,22 @@
 """lmdirect package for connecting to the local La Marzocco API."""
 import asyncio
 import logging
+from collections import ChainMap
 
 from lmdirect.const import (
     DISABLED,
     ENABLED,
+    KEY,
     MACHINE_NAME,
     MODEL_NAME,
     SERIAL_NUMBER,
 )
 
 from .connection import Connection
+from .flow import FlowStream
+from .mirror import format_region
+from .profile import SETTINGS_BY_KEY, ProfileResult
+from .transaction import DEFAULT_TIMEOUT, Change, Transaction
 from .msgs import (
     AUTO,
     AUTO_BITFIELD,
@@ -77,8 +83,73 @@ class LMDirect(Connection):
 
     @property
     def current_status(self):
-        """Return a dict of all the properties that have been received."""
-        return self._current_status
+        """Return a read-only dict of all the properties that have been received, as of the latest snapshot."""
+        return self._snapshot.status
+
+    @property
+    def snapshot(self):
+        """Return the latest (version, status) snapshot of the state."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        """Return the version of the latest snapshot."""
+        return self._snapshot.version
+
+    def changed_since(self, version):
+        """Return whether anything has changed since a version."""
+        return self._snapshot.version > version
+
+    def changes_since(self, version):
+        """Return the values that changed since a version, with None for values that went away."""
+        status = self._snapshot.status
+        return {
+            key: status.get(key)
+            for key, changed in self._key_versions.items()
+            if changed > version
+        }
+
+    @property
+    def mirror(self):
+        """Return the local copy of the machine's memory."""
+        return self._mirror
+
+    @property
+    def metrics(self):
+        """Return the connection's counters and latency histograms."""
+        return self._metrics
+
+    @property
+    def response_ttl(self):
+        """Return how many seconds a response is served from the mirror instead of re-reading it."""
+        return self._mirror.max_age
+
+    @response_ttl.setter
+    def response_ttl(self, value):
+        self._mirror.max_age = value
+
+    @property
+    def optimistic_ttl(self):
+        """Return how many seconds a written value is shown before it's rolled back if the machine doesn't report it."""
+        return self._optimistic.ttl
+
+    @optimistic_ttl.setter
+    def optimistic_ttl(self, value):
+        self._optimistic.ttl = value
+
+    @property
+    def lease_period(self):
+        """Return the seconds between lease windows, or None if commands connect as soon as they're sent."""
+        return self._lease_period
+
+    @lease_period.setter
+    def lease_period(self, value):
+        self._set_lease_period(value)
+
+    @property
+    def temp_history(self):
+        """Return the ring buffer of recent temperature reports."""
+        return self._temp_history
 
     @property
     def machine_name(self):
@@ -95,6 +166,11 @@ class LMDirect(Connection):
         """Return model name."""
         return self._machine_info[MODEL_NAME]
 
+    @property
+    def key(self):
+        """Return the machine's local encryption key, or None if it isn't known yet."""
+        return self._machine_info.get(KEY)
+
     @property
     def firmware_version(self):
         """Return firmware version."""
@@ -105,6 +181,26 @@ class LMDirect(Connection):
         if callable(callback):
             self._callback_list.append(callback)
 
+    def register_change_callback(self, callback):
+        """Register callback for the values that changed after each update."""
+        if callable(callback):
+            self._change_callback_list.append(callback)
+
+    def deregister_change_callback(self, callback):
+        """Deregister a change callback."""
+        if callback in self._change_callback_list:
+            self._change_callback_list.remove(callback)
+
+    def register_conflict_callback(self, callback):
+        """Register callback for written values that were rolled back, as {key: Conflict(expected, reported)}."""
+        if callable(callback):
+            self._conflict_callback_list.append(callback)
+
+    def deregister_conflict_callback(self, callback):
+        """Deregister a conflict callback."""
+        if callback in self._conflict_callback_list:
+            self._conflict_callback_list.remove(callback)
+
     def register_raw_callback(self, msg, callback, **kwargs):
         """Register a callback for the raw response to a command."""
         if callable(callback):
@@ -117,12 +213,16 @@ class LMDirect(Connection):
         if key in self._raw_callback_list:
             self._raw_callback_list.remove(key)
 
+    def flow_samples(self, **kwargs):
+        """Return an async iterator of water flow samples."""
+        return FlowStream(self, **kwargs)
+
     async def connect(self):
         """Connect to the machine."""
         return await self._connect()
 
-    async def request_status(self):
-        """Request new data."""
+    async def request_status(self, max_age=None):
+        """Request new data, only re-reading regions that are stale or have been written."""
         msgs = [
             Msg.GET_STATUS,
             Msg.GET_CONFIG,
@@ -135,17 +235,59 @@ class LMDirect(Connection):
         ]
 
         _LOGGER.debug("Requesting status")
-        await asyncio.gather(*[self._send_msg(msg) for msg in msgs])
+        reads = await self._stale_reads(msgs, max_age)
+        _, reads = self._join_reads(reads)
+        await self._send_reads(reads)
 
         """Also wait for current temp"""
         self._responses_waiting.append(MSGS[Msg.GET_TEMP_REPORT].msg)
 
+    async def refresh(self, msg_ids, max_age=None, timeout=DEFAULT_TIMEOUT):
+        """Re-read any stale regions for the given messages and wait for the responses."""
+        reads = await self._stale_reads(msg_ids, max_age)
+        if not reads:
+            return True
+
+        return await self._read(reads, timeout)
+
+    async def _stale_reads(self, msg_ids, max_age=None):
+        """Decode regions that are cached and return the reads needed for the rest."""
+        reads = []
+        for msg_id in msg_ids:
+            cur_msg = MSGS[msg_id]
+            ranges = self._mirror.stale_ranges(
+                cur_msg.address, cur_msg.length, max_age, max_length=cur_msg.length
+            )
+
+            if not ranges:
+                """Everything is cached, so decode it without going to the machine."""
+                data = self._mirror.read(cur_msg.address, cur_msg.length)
+                await self._populate_items(data, cur_msg)
+            elif ranges == [(cur_msg.address, cur_msg.length)] or any(
+                x[0] == msg_id for x in self._raw_callback_list
+            ):
+                reads.append(cur_msg.msg)
+            else:
+                """Only re-read the blocks that we need."""
+                reads.extend(format_region(*x) for x in ranges)
+
+        return reads
+
+    async def read_memory(self, address, length, max_age=None):
+        """Read a region of machine memory, skipping blocks that are already cached."""
+        ranges = self._mirror.stale_ranges(address, length, max_age)
+        await asyncio.gather(
+            *[self._send_raw_msg(format_region(*x), Msg.READ) for x in ranges]
+        )
+
     async def send_msg(self, msg_id, **kwargs):
         """Send a message to the machine."""
         await self._send_msg(msg_id, **kwargs)
 
     async def close(self):
         """Close the connection to the machine."""
+        await self._stop_confirming()
+        await self._stop_lease()
 
         """Wait for the read task to exit"""
         if self._read_reaper_task:
@@ -169,61 +311,237 @@ class LMDirect(Connection):
             None,
         )
 
-    def _get_key(self, k):
-        """Construct tag name if needed."""
-        if isinstance(k, tuple):
-            k = "_".join(k)
-        return k
+    def _address(self, msg_id, base=None):
+        """Return the address for a write, replacing the second byte with base if provided."""
+        address = MSGS[msg_id].address
+        return address if base is None else (address & 0xFF00) | base
 
     """Services"""
 
+    async def apply_profile(self, profile, max_age=None, **kwargs):
+        """Bring the machine in line with a dict of desired settings, only writing what differs."""
+        unknown = [x for x in profile if x not in SETTINGS_BY_KEY]
+        if unknown:
+            raise InvalidInput(f"apply_profile: Unknown settings {unknown}")
+
+        """Settings touched by the profile, in a stable order."""
+        settings = list(dict.fromkeys(SETTINGS_BY_KEY[x] for x in profile))
+
+        """Make sure that what we compare against is fresh enough."""
+        msg_ids = list(dict.fromkeys(y for x in settings for y in x.msg_ids))
+        if not await self.refresh(msg_ids, max_age):
+            raise NotReady("apply_profile: Couldn't read current settings")
+
+        txn = self.transaction(**kwargs)
+        changed = {}
+
+        for setting in settings:
+            values = {x: profile.get(x, txn.get(x)) for x in setting.keys}
+            if None in values.values():
+                raise NotReady(f"apply_profile: Current values unknown {values=}")
+
+            try:
+                change = setting.build(self, values, txn.status)
+            except ValueError as err:
+                raise InvalidInput(f"apply_profile: {err}") from err
+
+            diff = {
+                x: (self._current_status.get(x), change.updates[x])
+                for x in setting.keys
+                if x in profile and change.updates[x] != txn.get(x)
+            }
+
+            if diff:
+                changed.update(diff)
+                txn.add(change)
+
+        _LOGGER.debug(f"apply_profile: {len(changed)} settings differ")
+        return ProfileResult(changed, await txn.commit())
+
+    def transaction(self, **kwargs):
+        """Start a batch of setting changes that are sent together when committed."""
+        return Transaction(self, **kwargs)
+
+    async def _apply_change(self, change):
+        """Send the writes for a change and reflect it in the stored values."""
+        acks = []
+        for address, data in change.writes:
+            msg = format_region(address, len(data) // 2)
+            _LOGGER.debug(f"Writing {msg} with {data}")
+            future = self._expect_response(Msg.WRITE, msg)
+            try:
+                await self._send_raw_msg(msg, Msg.WRITE, data)
+            except Exception:
+                self._cancel_response(future)
+                raise
+            acks.append(future)
+
+        self._commit_change(change, acks=acks)
+
+    def _commit_change(self, change, callbacks=True, acks=None):
+        """Update the stored values to immediately reflect the change, until the machine confirms or rejects it"""
+        self._commit_changes([change], change.writes, callbacks, acks)
+
+    def _commit_changes(self, changes, writes, callbacks=True, acks=None):
+        """Reflect changes that were sent as the given writes, and check the written regions once for all of them."""
+        updates = {}
+        for change in changes:
+            updates.update(change.updates)
+
+        """The on and off times are derived from the written hours and minutes, so only those are tracked."""
+        status = ChainMap(updates, self._current_status)
+        derived = {}
+        for day in dict.fromkeys(y for x in changes for y in x.days):
+            derived.update(self.calculate_auto_sched_times(day, status))
+
+        changed = {
+            k: v
+            for k, v in {**updates, **derived}.items()
+            if k not in self._current_status or self._current_status[k] != v
+        }
+
+        self._track_change(updates, writes, acks)
+        self._current_status.update(derived)
+
+        if changed:
+            self._publish(changed)
+
+        if callbacks:
+            for entity_type in dict.fromkeys(y for x in changes for y in x.entity_types):
+                self._call_callbacks(entity_type=entity_type)
+
+    def _build_power(self, power):
+        """Build the change for power on or power off."""
+        power_value = 1 if power else 0
+        value = self._convert_to_ascii(power_value, size=1)
+
+        return Change(
+            Msg.SET_POWER,
+            [(self._address(Msg.SET_POWER), value)],
+            {POWER: power_value},
+            [TYPE_MAIN],
+        )
+
     async def set_power(self, power):
         """Send power on or power off commands."""
         async with self._locks[Msg.SET_POWER]:
-            power_value = 1 if power else 0
-            value = self._convert_to_ascii(power_value, size=1)
-            await self._send_msg(Msg.SET_POWER, data=value)
+            await self._apply_change(self._build_power(power))
+
+    def _build_auto_on_off_enable(self, day_of_week=None, enable=None, status=None):
+        """Build the change for enabling auto on/off for a day."""
+        if status is None:
+            status = self._current_status
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[POWER] = power_value
+        if None in [day_of_week, enable]:
+            raise InvalidInput(f"Some parameters invalid {day_of_week=} {enable=}")
 
-            self._call_callbacks(entity_type=TYPE_MAIN)
+        """We need the existing register value, so fail if we don't have it yet."""
+        if AUTO_BITFIELD not in status:
+            raise NotReady(f"Query not completed yet")
+
+        """Extract value for this field."""
+        bitfield = status[AUTO_BITFIELD]
+        bitmask = 0x01 << self._findkey((day_of_week, AUTO), AUTO_BITFIELD_MAP)
+        bitfield = bitfield | bitmask if enable else bitfield & ~bitmask
+        buf_to_send = self._convert_to_ascii(bitfield, 1)
+
+        _LOGGER.debug(
+            f"set_on_off_enable: {buf_to_send=}, {MSGS[Msg.SET_AUTO_ON_OFF_ENABLE].msg=}"
+        )
+
+        return Change(
+            Msg.SET_AUTO_ON_OFF_ENABLE,
+            [(self._address(Msg.SET_AUTO_ON_OFF_ENABLE), buf_to_send)],
+            {
+                self._get_key((day_of_week, AUTO)): ENABLED if enable else DISABLED,
+                AUTO_BITFIELD: bitfield,
+            },
+            [TYPE_AUTO_ON_OFF],
+        )
 
     async def set_auto_on_off_enable(self, day_of_week=None, enable=None):
         """Configure auto on/off."""
 
         async with self._locks[Msg.SET_AUTO_ON_OFF_ENABLE]:
-            if None in [day_of_week, enable]:
-                raise InvalidInput(f"Some parameters invalid {day_of_week=} {enable=}")
-
-            """We need the existing register value, so fail if we don't have it yet."""
-            if AUTO_BITFIELD not in self._current_status:
+            try:
+                change = self._build_auto_on_off_enable(day_of_week, enable)
+            except NotReady:
                 """Kick off a query so that we'll have the data later."""
                 await self._send_msg(Msg.GET_AUTO_ON_OFF_TIMES)
-                raise NotReady(f"Query not completed yet")
+                raise
+
+            await self._apply_change(change)
+
+    async def set_auto_on_off_global(self, value):
+        """Set global auto on/off."""
+        await self.set_auto_on_off_enable(GLOBAL, value)
 
-            """Extract value for this field."""
-            bitfield = self._current_status[AUTO_BITFIELD]
-            bitmask = 0x01 << self._findkey((day_of_week, AUTO), AUTO_BITFIELD_MAP)
-            bitfield = bitfield | bitmask if enable else bitfield & ~bitmask
-            buf_to_send = self._convert_to_ascii(bitfield, 1)
+    def _build_auto_on_off_times(
+        self,
+        day_of_week=None,
+        hour_on=None,
+        minute_on=None,
+        hour_off=None,
+        minute_off=None,
+    ):
+        """Build the change for auto on/off hours."""
+        if None in [day_of_week, hour_on, minute_on, hour_off, minute_off]:
+            raise InvalidInput(
+                f"Some parameters invalid {day_of_week=} {hour_on=} {minute_on=} {hour_off=} {minute_off=}"
+            )
 
-            _LOGGER.debug(
-                f"set_on_off_enable: {buf_to_send=}, {MSGS[Msg.SET_AUTO_ON_OFF_ENABLE].msg=}"
+        isinstance(hour_on, str) and (hour_on := int(hour_on))
+        isinstance(minute_on, str) and (minute_on := int(minute_on))
+
+        isinstance(hour_off, str) and (hour_off := int(hour_off))
+        isinstance(minute_off, str) and (minute_off := int(minute_off))
+
+        """Validate input."""
+        if not (
+            0 <= hour_on <= 23
+            and 0 <= minute_on <= 59
+            and 0 <= hour_off <= 23
+            and 0 <= minute_off <= 59
+            and day_of_week in DAYS
+        ):
+            raise InvalidInput(
+                f"set_auto_on_off_times: Invalid values {day_of_week=} {hour_on=} {minute_on=} {hour_off=} {minute_off=}"
             )
-            await self._send_msg(Msg.SET_AUTO_ON_OFF_ENABLE, data=buf_to_send)
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[self._get_key((day_of_week, AUTO))] = ENABLED if enable else DISABLED
-                state[AUTO_BITFIELD] = bitfield
+        """Hours."""
+        hours = self._convert_to_ascii(hour_on, size=1) + self._convert_to_ascii(
+            hour_off, size=1
+        )
+        hours_address = self._address(
+            Msg.SET_AUTO_ON_OFF_TIMES,
+            Msg.AUTO_ON_OFF_HOUR_BASE + (DAYS.index(day_of_week) * 2),
+        )
 
-            self._call_callbacks(entity_type=TYPE_AUTO_ON_OFF)
+        """Minutes."""
+        minutes = self._convert_to_ascii(minute_on, size=1) + self._convert_to_ascii(
+            minute_off, size=1
+        )
+        minutes_address = self._address(
+            Msg.SET_AUTO_ON_OFF_TIMES,
+            Msg.AUTO_ON_OFF_MIN_BASE + (DAYS.index(day_of_week) * 2),
+        )
 
-    async def set_auto_on_off_global(self, value):
-        """Set global auto on/off."""
-        await self.set_auto_on_off_enable(GLOBAL, value)
+        _LOGGER.debug(
+            f"set_on_off_times: {hours=}, {hours_address=}, {minutes=}, {minutes_address=}"
+        )
+
+        return Change(
+            Msg.SET_AUTO_ON_OFF_TIMES,
+            [(hours_address, hours), (minutes_address, minutes)],
+            {
+                self._get_key((day_of_week, ON, HOUR)): hour_on,
+                self._get_key((day_of_week, ON, MIN)): minute_on,
+                self._get_key((day_of_week, OFF, HOUR)): hour_off,
+                self._get_key((day_of_week, OFF, MIN)): minute_off,
+            },
+            [TYPE_MAIN],
+            [day_of_week],
+        )
 
     async def set_auto_on_off_times(
         self,
@@ -235,277 +553,265 @@ class LMDirect(Connection):
     ):
         """Configure auto on/off hours."""
         async with self._locks[Msg.SET_AUTO_ON_OFF_TIMES]:
-            if None in [day_of_week, hour_on, minute_on, hour_off, minute_off]:
-                raise InvalidInput(
-                    f"Some parameters invalid {day_of_week=} {hour_on=} {minute_on=} {hour_off=} {minute_off=}"
-                )
-
-            isinstance(hour_on, str) and (hour_on := int(hour_on))
-            isinstance(minute_on, str) and (minute_on := int(minute_on))
-
-            isinstance(hour_off, str) and (hour_off := int(hour_off))
-            isinstance(minute_off, str) and (minute_off := int(minute_off))
-
-            """Validate input."""
-            if not (
-                0 <= hour_on <= 23
-                and 0 <= minute_on <= 59
-                and 0 <= hour_off <= 23
-                and 0 <= minute_off <= 59
-                and day_of_week in DAYS
-            ):
-                raise InvalidInput(
-                    f"set_auto_on_off_times: Invalid values {day_of_week=} {hour_on=} {minute_on=} {hour_off=} {minute_off=}"
+            await self._apply_change(
+                self._build_auto_on_off_times(
+                    day_of_week, hour_on, minute_on, hour_off, minute_off
                 )
-
-            """Update hours."""
-            data = self._convert_to_ascii(hour_on, size=1) + self._convert_to_ascii(
-                hour_off, size=1
             )
-            address_base = self._convert_to_ascii(
-                Msg.AUTO_ON_OFF_HOUR_BASE + (DAYS.index(day_of_week) * 2), size=1
-            )
-            _LOGGER.debug(
-                f"set_on_off_times: {data=}, {address_base=}, {MSGS[Msg.SET_AUTO_ON_OFF_TIMES].msg=}"
-            )
-            await self._send_msg(Msg.SET_AUTO_ON_OFF_TIMES, base=address_base, data=data)
 
-            """Update minutes."""
-            data = self._convert_to_ascii(minute_on, size=1) + self._convert_to_ascii(
-                minute_off, size=1
-            )
-            address_base = self._convert_to_ascii(
-                Msg.AUTO_ON_OFF_MIN_BASE + (DAYS.index(day_of_week) * 2), size=1
-            )
-            _LOGGER.debug(
-                f"set_on_off_times: {data=}, {address_base=}, {MSGS[Msg.SET_AUTO_ON_OFF_TIMES].msg=}"
+    def _build_dose(self, key=None, pulses=None):
+        """Build the change for a coffee dose in pulses (~0.5ml)."""
+        if None in [key, pulses]:
+            raise InvalidInput(
+                f"set_dose: Some parameters not specified {key=} {pulses=}"
             )
-            await self._send_msg(Msg.SET_AUTO_ON_OFF_TIMES, base=address_base, data=data)
 
-        """Update the stored values to immediately reflect the change"""
-        for state in [self._temp_state, self._current_status]:
-            state[self._get_key((day_of_week, ON, HOUR))] = hour_on
-            state[self._get_key((day_of_week, ON, MIN))] = minute_on
-            state[self._get_key((day_of_week, OFF, HOUR))] = hour_off
-            state[self._get_key((day_of_week, OFF, MIN))] = minute_off
+        isinstance(pulses, str) and (pulses := int(pulses))
+        isinstance(key, str) and (key := int(key))
 
-        self.calculate_auto_sched_times(day_of_week)
+        """Validate input."""
+        if not (1 <= pulses <= 1000 and 1 <= key <= 5):
+            raise InvalidInput(f"set_dose: Invalid values {pulses=} {key=}")
 
-        self._call_callbacks(entity_type=TYPE_MAIN)
+        data = self._convert_to_ascii(pulses, size=2)
+        address = self._address(Msg.SET_DOSE, Msg.DOSE_KEY_BASE + (key - 1) * 2)
+
+        return Change(
+            Msg.SET_DOSE,
+            [(address, data)],
+            {self._get_key((DOSE, f"k{key}")): pulses},
+            [TYPE_MAIN],
+        )
 
     async def set_dose(self, key=None, pulses=None):
         """Set the coffee dose in pulses (~0.5ml)."""
 
         async with self._locks[Msg.SET_DOSE]:
-            if None in [key, pulses]:
-                raise InvalidInput(
-                    f"set_dose: Some parameters not specified {key=} {pulses=}"
-                )
+            await self._apply_change(self._build_dose(key, pulses))
 
-            isinstance(pulses, str) and (pulses := int(pulses))
-            isinstance(key, str) and (key := int(key))
+    def _build_dose_hot_water(self, seconds=None):
+        """Build the change for the hot water dose in seconds."""
+        if seconds is None:
+            raise InvalidInput("set_dose_hot_water: Seconds not specified")
 
-            """Validate input."""
-            if not (1 <= pulses <= 1000 and 1 <= key <= 5):
-                raise InvalidInput(f"set_dose: Invalid values {pulses=} {key=}")
+        isinstance(seconds, str) and (seconds := int(seconds))
 
-            data = self._convert_to_ascii(pulses, size=2)
-            key = self._convert_to_ascii(Msg.DOSE_KEY_BASE + (key - 1) * 2, size=1)
-            await self._send_msg(Msg.SET_DOSE, base=key, data=data)
+        """Validate input."""
+        if not (1 <= seconds <= 30):
+            raise InvalidInput(f"Invalid values {seconds=}")
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[self._get_key((DOSE, f"k{key}"))] = pulses
+        data = self._convert_to_ascii(seconds, size=1)
 
-            self._call_callbacks(entity_type=TYPE_MAIN)
+        return Change(
+            Msg.SET_DOSE_HOT_WATER,
+            [(self._address(Msg.SET_DOSE_HOT_WATER), data)],
+            {DOSE_HOT_WATER: seconds},
+            [TYPE_MAIN],
+        )
 
     async def set_dose_hot_water(self, seconds=None):
         """Set the hot water dose in seconds."""
 
         async with self._locks[Msg.SET_DOSE_HOT_WATER]:
-            if seconds is None:
-                raise InvalidInput("set_dose_hot_water: Seconds not specified")
+            await self._apply_change(self._build_dose_hot_water(seconds))
 
-            isinstance(seconds, str) and (seconds := int(seconds))
+    def _build_prebrew_times(self, key=None, seconds_on=None, seconds_off=None):
+        """Build the change for prebrew on/off times in seconds."""
+        if None in [key, seconds_on, seconds_off]:
+            raise InvalidInput(
+                "set_prebrew_times: Some parameters invalid {key=} {seconds_on=} {seconds_off=}"
+            )
+
+        seconds_on, seconds_off = [float(x) for x in [seconds_on, seconds_off]]
+        isinstance(key, str) and (key := int(key))
 
-            """Validate input."""
-            if not (1 <= seconds <= 30):
-                raise InvalidInput(f"Invalid values {seconds=}")
+        """Validate input."""
+        if not (
+            0 <= seconds_on <= 5.9 and 0 <= seconds_off <= 5.9 and 1 <= key <= 4
+        ):
+            raise InvalidInput(f"Invalid values {seconds_on=} {seconds_off=}")
 
-            data = self._convert_to_ascii(seconds, size=1)
-            await self._send_msg(Msg.SET_DOSE_HOT_WATER, data=data)
+        if not (
+            (self.model_name == MODEL_GS3_AV and 1 <= key <= 4)
+            or (self.model_name == MODEL_LM and key == 1)
+        ):
+            raise InvalidInput(f"Invalid values {key=}")
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[DOSE_HOT_WATER] = seconds
+        """Set "on" time."""
+        address_on = self._address(Msg.SET_PREBREW_TIMES, Msg.PREBREW_ON_BASE + (key - 1))
+        data_on = self._convert_to_ascii(int(seconds_on * 10), size=1)
 
-            self._call_callbacks(entity_type=TYPE_MAIN)
+        """Set "off" time."""
+        address_off = self._address(
+            Msg.SET_PREBREW_TIMES, Msg.PREBREW_OFF_BASE + (key - 1)
+        )
+        data_off = self._convert_to_ascii(int(seconds_off * 10), size=1)
+
+        return Change(
+            Msg.SET_PREBREW_TIMES,
+            [(address_on, data_on), (address_off, data_off)],
+            {
+                self._get_key((PREBREWING, TON, f"k{key}")): seconds_on,
+                self._get_key((PREBREWING, TOFF, f"k{key}")): seconds_off,
+            },
+            [TYPE_PREBREW],
+        )
 
     async def set_prebrew_times(self, key=None, seconds_on=None, seconds_off=None):
         """Set prebrew on/off times in seconds."""
 
         async with self._locks[Msg.SET_PREBREW_TIMES]:
-            if None in [key, seconds_on, seconds_off]:
-                raise InvalidInput(
-                    "set_prebrew_times: Some parameters invalid {key=} {seconds_on=} {seconds_off=}"
-                )
-
-            seconds_on, seconds_off = [float(x) for x in [seconds_on, seconds_off]]
-            isinstance(key, str) and (key := int(key))
-
-            """Validate input."""
-            if not (
-                0 <= seconds_on <= 5.9 and 0 <= seconds_off <= 5.9 and 1 <= key <= 4
-            ):
-                raise InvalidInput(f"Invalid values {seconds_on=} {seconds_off=}")
-
-            if not (
-                (self.model_name == MODEL_GS3_AV and 1 <= key <= 4)
-                or (self.model_name == MODEL_LM and key == 1)
-            ):
-                raise InvalidInput(f"Invalid values {key=}")
-
-            """Set "on" time."""
-            key_on = self._convert_to_ascii(Msg.PREBREW_ON_BASE + (key - 1), size=1)
-            data = self._convert_to_ascii(int(seconds_on * 10), size=1)
-            await self._send_msg(Msg.SET_PREBREW_TIMES, base=key_on, data=data)
-
-            """Set "off" time."""
-            key_off = self._convert_to_ascii(Msg.PREBREW_OFF_BASE + (key - 1), size=1)
-            data = self._convert_to_ascii(int(seconds_off * 10), size=1)
-            await self._send_msg(Msg.SET_PREBREW_TIMES, base=key_off, data=data)
+            await self._apply_change(
+                self._build_prebrew_times(key, seconds_on, seconds_off)
+            )
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[self._get_key((PREBREWING, TON, f"k{key}"))] = seconds_on
-                state[self._get_key((PREBREWING, TOFF, f"k{key}"))] = seconds_off
+    def _build_preinfusion_time(self, key=None, seconds=None):
+        """Build the change for preinfusion times in seconds."""
+        if None in [key, seconds]:
+            raise InvalidInput(
+                "set_preinfusion_time: Some parameters invalid {key=} {seconds=}"
+            )
 
-            self._call_callbacks(entity_type=TYPE_PREBREW)
+        seconds = float(seconds)
+        isinstance(key, str) and (key := int(key))
+
+        """Validate input."""
+        if not (
+            0 <= seconds <= 24.9 and 1 <= key <= 4
+        ):
+            raise InvalidInput(f"Invalid values {seconds=}")
+
+        if not (
+            (self.model_name == MODEL_GS3_AV and 1 <= key <= 4)
+            or (self.model_name == MODEL_LM and key == 1)
+        ):
+            raise InvalidInput(f"Invalid values {key=}")
+
+        address = self._address(Msg.SET_PREINFUSION_TIME, Msg.PREINFUSION_BASE + (key - 1))
+        data = self._convert_to_ascii(int(seconds * 10), size=1)
+
+        return Change(
+            Msg.SET_PREINFUSION_TIME,
+            [(address, data)],
+            {self._get_key((PREINFUSION, f"k{key}")): seconds},
+            [TYPE_PREBREW],
+        )
 
     async def set_preinfusion_time(self, key=None, seconds=None):
         """Set preinfusion times in seconds."""
 
         async with self._locks[Msg.SET_PREINFUSION_TIME]:
-            if None in [key, seconds]:
-                raise InvalidInput(
-                    "set_preinfusion_time: Some parameters invalid {key=} {seconds=}"
-                )
-
-            seconds = float(seconds)
-            isinstance(key, str) and (key := int(key))
-
-            """Validate input."""
-            if not (
-                0 <= seconds <= 24.9 and 1 <= key <= 4
-            ):
-                raise InvalidInput(f"Invalid values {seconds=}")
+            await self._apply_change(self._build_preinfusion_time(key, seconds))
 
-            if not (
-                (self.model_name == MODEL_GS3_AV and 1 <= key <= 4)
-                or (self.model_name == MODEL_LM and key == 1)
-            ):
-                raise InvalidInput(f"Invalid values {key=}")
+    def _build_coffee_temp(self, temp=None):
+        """Build the change for the coffee boiler temp in Celcius."""
+        if temp is None:
+            raise InvalidInput("set_coffee__temp: Temperature not specified")
 
-            """Set "on" time."""
-            key = self._convert_to_ascii(Msg.PREINFUSION_BASE + (key - 1), size=1)
-            data = self._convert_to_ascii(int(seconds * 10), size=1)
-            await self._send_msg(Msg.SET_PREINFUSION_TIME, base=key, data=data)
+        isinstance(temp, str) and (temp := float(temp))
+        temp = round(temp, 1)
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[self._get_key((PREINFUSION, f"k{key}"))] = seconds
+        data = self._convert_to_ascii(int(temp * 10), size=2)
 
-            self._call_callbacks(entity_type=TYPE_PREBREW)
+        return Change(
+            Msg.SET_COFFEE_TEMP,
+            [(self._address(Msg.SET_COFFEE_TEMP), data)],
+            {TSET_COFFEE: temp},
+            [TYPE_COFFEE_TEMP],
+        )
 
     async def set_coffee_temp(self, temp=None):
         """Set the coffee boiler temp in Celcius."""
 
         async with self._locks[Msg.SET_COFFEE_TEMP]:
-            if temp is None:
-                raise InvalidInput("set_coffee__temp: Temperature not specified")
+            await self._apply_change(self._build_coffee_temp(temp))
 
-            isinstance(temp, str) and (temp := float(temp))
-            temp = round(temp, 1)
+    def _build_steam_temp(self, temp=None):
+        """Build the change for the steam boiler temp in Celcius."""
+        if temp is None:
+            raise InvalidInput("set_steam_temp: Temperature not specified")
 
-            data = self._convert_to_ascii(int(temp * 10), size=2)
-            await self._send_msg(Msg.SET_COFFEE_TEMP, data=data)
+        isinstance(temp, str) and (temp := float(temp))
+        temp = round(temp, 1)
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[TSET_COFFEE] = temp
+        data = self._convert_to_ascii(int(temp * 10), size=2)
 
-            self._call_callbacks(entity_type=TYPE_COFFEE_TEMP)
+        return Change(
+            Msg.SET_STEAM_TEMP,
+            [(self._address(Msg.SET_STEAM_TEMP), data)],
+            {TSET_STEAM: temp},
+            [TYPE_STEAM_TEMP],
+        )
 
     async def set_steam_temp(self, temp=None):
         """Set the steam boiler temp in Celcius."""
 
         async with self._locks[Msg.SET_STEAM_TEMP]:
-            if temp is None:
-                raise InvalidInput("set_steam_temp: Temperature not specified")
-
-            isinstance(temp, str) and (temp := float(temp))
-            temp = round(temp, 1)
-
-            data = self._convert_to_ascii(int(temp * 10), size=2)
-            await self._send_msg(Msg.SET_STEAM_TEMP, data=data)
-
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[TSET_STEAM] = temp
-
-            self._call_callbacks(entity_type=TYPE_STEAM_TEMP)
+            await self._apply_change(self._build_steam_temp(temp))
+
+    def _build_prebrewing_enable(self, enable):
+        """Build the change for turning prebrewing on or off."""
+        value = 1 if enable else 0
+        data = self._convert_to_ascii(value, size=1)
+
+        return Change(
+            Msg.SET_PREBREWING_ENABLE,
+            [(self._address(Msg.SET_PREBREWING_ENABLE), data)],
+            {
+                PREBREW_FLAG: value,
+                ENABLE_PREBREWING: (value == 1),
+                ENABLE_PREINFUSION: (value == 2),
+            },
+            [TYPE_PREBREW, TYPE_PREINFUSION],
+        )
 
     async def set_prebrewing_enable(self, enable):
         """Turn prebrewing on or off."""
 
         async with self._locks[Msg.SET_PREBREWING_ENABLE]:
-            value = 1 if enable else 0
-            data = self._convert_to_ascii(value, size=1)
+            await self._apply_change(self._build_prebrewing_enable(enable))
 
-            await self._send_msg(Msg.SET_PREBREWING_ENABLE, data=data)
+    def _build_preinfusion_enable(self, enable):
+        """Build the change for turning preinfusion on or off."""
 
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[PREBREW_FLAG] = value
-                state[ENABLE_PREBREWING] = (value == 1)
-                state[ENABLE_PREINFUSION] = (value == 2)
-
-            self._call_callbacks(entity_type=TYPE_PREBREW)
-            self._call_callbacks(entity_type=TYPE_PREINFUSION)
+        """Preinfusion is essentially a variant of prebrewing."""
+        value = 2 if enable else 0
+        data = self._convert_to_ascii(value, size=1)
+
+        return Change(
+            Msg.SET_PREBREWING_ENABLE,
+            [(self._address(Msg.SET_PREBREWING_ENABLE), data)],
+            {
+                PREBREW_FLAG: value,
+                ENABLE_PREINFUSION: (value == 2),
+                ENABLE_PREBREWING: (value == 1),
+            },
+            [TYPE_PREINFUSION, TYPE_PREBREW],
+        )
 
     async def set_preinfusion_enable(self, enable):
         """Turn preinfusion on or off."""
 
-        """Preinfusion is essentially a variant of prebrewing."""
         async with self._locks[Msg.SET_PREBREWING_ENABLE]:
-            value = 2 if enable else 0
-            data = self._convert_to_ascii(value, size=1)
-
-            await self._send_msg(Msg.SET_PREBREWING_ENABLE, data=data)
-
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[PREBREW_FLAG] = value
-                state[ENABLE_PREINFUSION] = (value == 2)
-                state[ENABLE_PREBREWING] = (value == 1)
-
-            self._call_callbacks(entity_type=TYPE_PREINFUSION)
-            self._call_callbacks(entity_type=TYPE_PREBREW)
+            await self._apply_change(self._build_preinfusion_enable(enable))
+
+    def _build_steam_boiler_enable(self, enable):
+        """Build the change for enabling or disabling the steam boiler."""
+        value = 0x81 if enable else 0x01
+        data = self._convert_to_ascii(value, size=1)
+
+        return Change(
+            Msg.SET_STEAM_BOILER_ENABLE,
+            [(self._address(Msg.SET_STEAM_BOILER_ENABLE), data)],
+            {STEAM_BOILER_ENABLE: enable},
+            [TYPE_STEAM_BOILER_ENABLE],
+        )
 
     async def set_steam_boiler_enable(self, enable):
         """Enable or disable the steam boiler."""
 
         async with self._locks[Msg.SET_STEAM_BOILER_ENABLE]:
-            value = 0x81 if enable else 0x01
-            data = self._convert_to_ascii(value, size=1)
-
-            await self._send_msg(Msg.SET_STEAM_BOILER_ENABLE, data=data)
-
-            """Update the stored values to immediately reflect the change"""
-            for state in [self._temp_state, self._current_status]:
-                state[STEAM_BOILER_ENABLE] = enable
-
-            self._call_callbacks(entity_type=TYPE_STEAM_BOILER_ENABLE)
+            await self._apply_change(self._build_steam_boiler_enable(enable))
 
     async def set_start_backflush(self):
         """Initiate a backflush cycle."""
@@ -0,0 +1,118 @@
+"""Vectorized decoding of many frames of the same message."""
+import numpy as np
+
+from .const import CALCULATED_VALUE, DISABLED, ENABLED
+from .decoder import find_msg_id, get_key
+from .msgs import (
+    AUTO_BITFIELD,
+    AUTO_BITFIELD_MAP,
+    DAYS_SINCE_BUILT,
+    DIVIDE_KEYS,
+    FIRMWARE_VER,
+    FRONT_PANEL_DISPLAY,
+    MSGS,
+    SERIAL_NUMBERS,
+    STEAM_BOILER_ENABLE,
+    Elem,
+)
+
+
+def to_array(payloads, length):
+    """Convert ASCII-encoded hex payloads of the same message to an (n, length) uint8 array."""
+    size = length * 2
+    payloads = [x[:size] for x in payloads]
+
+    if any(len(x) != size for x in payloads):
+        raise ValueError(f"Payloads must all be at least {length} bytes")
+
+    """Convert everything in one pass."""
+    return np.frombuffer(bytes.fromhex("".join(payloads)), dtype=np.uint8).reshape(
+        len(payloads), length
+    )
+
+
+def _extract(array, elem):
+    """Extract a field column from the byte array. STRING fields are left as (n, size) bytes."""
+    column = array[:, elem.index : elem.index + elem.size]
+
+    if elem.type == Elem.STRING:
+        return column
+
+    """Big-endian, so the first byte is the most significant."""
+    value = np.zeros(len(array), dtype=np.int64)
+    for i in range(elem.size):
+        value = (value << 8) | column[:, i]
+    return value
+
+
+def _to_str(column):
+    """Decode (n, size) bytes as latin-1 strings. Trailing nulls are dropped."""
+    return column.astype(np.uint32).view(f"U{column.shape[1]}").ravel()
+
+
+def _convert(key, value):
+    """Apply the same scaling rules as decoder.convert to a whole column."""
+    if any(x in key for x in DIVIDE_KEYS):
+        value = value / 10
+    elif key == FIRMWARE_VER:
+        value = np.char.mod("%0.2f", value / 100)
+    elif key in SERIAL_NUMBERS:
+        """Chop off anything after the first null."""
+        after_null = np.cumsum(value == 0, axis=1) > 0
+        value = _to_str(np.where(after_null, 0, value))
+    elif key == DAYS_SINCE_BUILT:
+        """Convert hours to days. Both round halves to even."""
+        value = np.round(value / 24).astype(np.int64)
+    elif key == FRONT_PANEL_DISPLAY:
+        value = _to_str(value)
+        for old, new in [("\xdf", "\u00b0"), ("\xdb", "\u25A1"), ("\xff", "\u25A0")]:
+            value = np.char.replace(value, old, new)
+    elif key == STEAM_BOILER_ENABLE:
+        value = (value & 0x01) == 1
+    elif value.ndim == 2:
+        """Other strings stay ASCII-encoded hex."""
+        value = np.array([bytes(x).hex().upper() for x in value])
+
+    return value
+
+
+def decode_batch(msg_id, payloads):
+    """Decode the data of many frames of one message into a dict of columns, like decoder.decode but with HEATING_STATE left as a bitmask."""
+    cur_msg = MSGS[msg_id]
+    if cur_msg.map is None:
+        raise ValueError(f"{msg_id} has no map")
+
+    array = to_array(payloads, cur_msg.length)
+    result = {}
+
+    for elem, raw_key in cur_msg.map.items():
+        if elem.index == CALCULATED_VALUE:
+            continue
+
+        key = get_key(raw_key)
+        value = _convert(key, _extract(array, elem))
+        result[key] = value
+
+        if key == AUTO_BITFIELD:
+            for i, item in enumerate(AUTO_BITFIELD_MAP):
+                result[get_key(AUTO_BITFIELD_MAP[item])] = np.where(
+                    (value >> i) & 0x01, ENABLED, DISABLED
+                )
+
+    return result
+
+
+def group_frames(plaintexts):
+    """Group decrypted frames by message and return {msg_id: [data, ...]}, skipping unknown messages."""
+    result = {}
+    for plaintext in plaintexts:
+        msg_id = find_msg_id(plaintext[0], plaintext[1:9])
+        if msg_id is None or MSGS[msg_id].map is None:
+            continue
+        result.setdefault(msg_id, []).append(plaintext[9:-2])
+    return result
+
+
+def to_records(columns):
+    """Return a dict of columns as a NumPy structured array."""
+    return np.rec.fromarrays(list(columns.values()), names=list(columns.keys()))
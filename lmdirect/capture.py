@@ -0,0 +1,126 @@
+"""Capture of plaintext frames and deterministic replay through the decoder."""
+import asyncio
+import logging
+import struct
+import sys
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"LMCAP1\n"
+
+INBOUND = 0
+OUTBOUND = 1
+
+"""Each record is a monotonic timestamp, a direction and a length, followed by the plaintext."""
+RECORD_HEADER = struct.Struct("<dBI")
+
+
+class FrameCapture:
+    """Appends plaintext frames to a compact binary log."""
+
+    def __init__(self, path):
+        self._path = path
+        self._file = open(path, "ab")
+        self._frames = 0
+
+        if not self._file.tell():
+            self._file.write(MAGIC)
+
+    @property
+    def path(self):
+        """Return the path of the log."""
+        return self._path
+
+    @property
+    def frames(self):
+        """Return the number of frames written."""
+        return self._frames
+
+    def write(self, direction, plaintext, timestamp=None):
+        """Append a frame."""
+        data = plaintext.encode("latin-1")
+        self._file.write(
+            RECORD_HEADER.pack(
+                time.monotonic() if timestamp is None else timestamp,
+                direction,
+                len(data),
+            )
+        )
+        self._file.write(data)
+        self._frames += 1
+
+    def close(self):
+        """Flush and close the log."""
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_capture(path):
+    """Yield (timestamp, direction, plaintext) for every frame in a log."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame capture")
+
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            timestamp, direction, length = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                _LOGGER.warning(f"Truncated frame at end of {path}")
+                return
+
+            yield timestamp, direction, data.decode("latin-1")
+
+
+async def replay(connection, path, realtime=False, cipher=None, callbacks=False):
+    """Push the inbound frames in a log through a connection's receive path and return statistics."""
+    frames = [(x[0], x[2]) for x in read_capture(path) if x[1] == INBOUND]
+
+    """Encrypt up front so that decryption is part of what we measure."""
+    if cipher is not None:
+        frames = [(x, cipher.encrypt(y)) for x, y in frames]
+
+    failures = 0
+    start = time.perf_counter()
+    first_timestamp = frames[0][0] if frames else 0
+
+    for timestamp, frame in frames:
+        if realtime:
+            delay = (timestamp - first_timestamp) - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        plaintext = cipher.decrypt(frame) if cipher is not None else frame
+        if not await connection.process_data(plaintext):
+            failures += 1
+
+        if callbacks:
+            connection._call_callbacks()
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        "frames": len(frames),
+        "failures": failures,
+        "elapsed": elapsed,
+        "frames_per_sec": len(frames) / elapsed if elapsed else 0,
+    }
+
+
+async def _main(path, realtime):
+    from . import LMDirect
+
+    stats = await replay(LMDirect({}), path, realtime=realtime)
+    print(stats)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m lmdirect.capture <capture file> [--realtime]")
+        sys.exit(1)
+
+    asyncio.run(_main(sys.argv[1], "--realtime" in sys.argv[2:]))
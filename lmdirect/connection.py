@@ -1,29 +1,62 @@
 """lmdirect connection class."""
 import asyncio
 import logging
+import time
+from collections import namedtuple
 from datetime import datetime, timedelta
 from functools import partial
+from types import MappingProxyType
 
 from authlib.integrations.base_client.errors import OAuthError
 from authlib.integrations.httpx_client import AsyncOAuth2Client
 
 from .aescipher import AESCipher
+from .capture import INBOUND, OUTBOUND, FrameCapture
 from .const import *
+from .decoder import convert, expand_bitfield, extract, find_msg_id, get_key
+from .history import TempHistory
+from .metrics import (
+    CALLBACK_TIME,
+    COMMAND_FAILED,
+    CONFLICTS,
+    CONNECT_FAILURES,
+    CONNECTS,
+    DECODE_TIME,
+    DECRYPT_FAILED,
+    DECRYPT_TIME,
+    ERRORS,
+    FRAMES_IN,
+    FRAMES_OUT,
+    MALFORMED_RESPONSE,
+    POLLS_DROPPED,
+    REQUEST_RTT,
+    UNEXPECTED_RESPONSE,
+    Metrics,
+)
+from .mirror import MemoryMirror, format_region, parse_region
+from .optimistic import OptimisticValues
+from .scheduler import PRIORITY_POLL, PRIORITY_WRITE, SendScheduler
+from .state import State
+from .tracing import (
+    CALLBACKS_DISPATCHED,
+    CONNECT_END,
+    CONNECT_START,
+    FRAME_DECODED,
+    FRAME_DECRYPTED,
+    FRAME_ENCODED,
+    FRAME_RECEIVED,
+    FRAME_WRITTEN,
+    NULL_TRACER,
+)
 from .msgs import (
     AUTO_BITFIELD,
-    AUTO_BITFIELD_MAP,
     AUTO_SCHED_MAP,
     CURRENT_PULSE_COUNT,
-    DAYS_SINCE_BUILT,
-    DIVIDE_KEYS,
     DRINK_OFFSET_MAP,
     ENABLE_PREBREWING,
     ENABLE_PREINFUSION,
-    FIRMWARE_VER,
-    FRONT_PANEL_DISPLAY,
     GATEWAY_DRINK_MAP,
     HEATING_STATE,
-    HEATING_VALUES,
     HOUR,
     KEY_ACTIVE,
     MIN,
@@ -31,9 +64,8 @@ from .msgs import (
     OFF,
     ON,
     PREBREW_FLAG,
-    SERIAL_NUMBERS,
-    STEAM_BOILER_ENABLE,
     TEMP_COFFEE,
+    TEMP_STEAM,
     TIME,
     TOTAL_COFFEE,
     TOTAL_COFFEE_ACTIVATIONS,
@@ -43,12 +75,29 @@ from .msgs import (
     BREW_GROUP_OFFSET,
     T_UNIT,
     FACTORY_OFFSET,
-    Elem,
     Msg,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
+"""A read-only copy of the state and its version."""
+Snapshot = namedtuple("Snapshot", ["version", "status"])
+
+"""Seconds to wait for a response before giving up on it."""
+DEFAULT_RESPONSE_TIMEOUT = 5
+
+
+def checksum(buffer):
+    """Compute check byte."""
+    buffer = bytes(buffer, "utf-8")
+    return "%0.2X" % (sum(buffer) % 256)
+
+
+"""Reads that we know how to decode, in the order they should be decoded."""
+DECODABLE_MSGS = [
+    MSGS[x] for x in MSGS if MSGS[x].msg_type == Msg.READ and MSGS[x].map is not None
+]
+
 
 class Connection:
     def __init__(self, machine_info):
@@ -57,28 +106,65 @@ class Connection:
         self._writer = None
         self._read_response_task = None
         self._read_reaper_task = None
-        self._current_status = {}
+        self._current_status = State()
         self._responses_waiting = []
         self._run = True
         self._callback_list = []
         self._raw_callback_list = []
+        self._change_callback_list = []
         self._cipher = None
         self._machine_info = machine_info
         self._start_time = None
         self._connected = False
-        self._lock = asyncio.Lock()
+        self._scheduler = SendScheduler()
         self._first_time = True
         self._update_available = None
         self._initialized_machine_info = False
 
-        """Maintain temporary states for device states that take a while to update"""
-        self._temp_state = {}
+        """Read-only copy of the state that's republished with a new version whenever it changes,
+        and the version in which each key last changed"""
+        self._snapshot = Snapshot(0, MappingProxyType({}))
+        self._key_versions = State()
+
+        """Written values that the machine hasn't confirmed yet, and listeners for the ones it rejects"""
+        self._optimistic = OptimisticValues()
+        self._conflict_callback_list = []
+        self._confirm_tasks = set()
+
+        """Local copy of the machine's memory so that repeated reads stay off the wire"""
+        self._mirror = MemoryMirror()
+
+        """Futures waiting for the response to a specific message"""
+        self._response_futures = {}
+
+        """Reads that have been sent and not answered, so that identical reads can share them"""
+        self._inflight_reads = {}
+
+        """Writes that have been sent and not acknowledged, by message, oldest first, as
+        (address, length, future), so that only writes to the same addresses wait for each other"""
+        self._inflight_writes = {}
+
+        """Recent temperature reports"""
+        self._temp_history = TempHistory()
+
+        """Optional log of every frame sent and received"""
+        self._capture = None
+
+        """Counters and latency histograms, and when each outstanding request was sent"""
+        self._metrics = Metrics()
+        self._sent_times = {}
+
+        """Receives trace events, if enabled"""
+        self._tracer = NULL_TRACER
+
+        """In lease mode, bursts queued for the next lease window and the task that runs them"""
+        self._lease_period = None
+        self._leased = []
+        self._lease_task = None
+        self._answered = asyncio.Event()
 
-    def _get_key(self, k):
-        """Construct tag name if needed."""
-        if isinstance(k, tuple):
-            k = "_".join(k)
-        return k
+    """Construct tag name if needed."""
+    _get_key = staticmethod(get_key)
 
     async def retrieve_machine_info(self, machine_info):
         """Retrieve the machine info from the cloud APIs."""
@@ -157,11 +243,23 @@ class Connection:
 
         _LOGGER.debug(f"Connecting")
 
+        if not self._initialized_machine_info and CLIENT_ID not in self._machine_info:
+            """Local-only setup, e.g. a simulated machine, so the key has to be provided."""
+            self._current_status.update(
+                {
+                    MACHINE_NAME: self._machine_info.get(MACHINE_NAME),
+                    MODEL_NAME: self._machine_info.get(MODEL_NAME),
+                }
+            )
+            self._initialized_machine_info = True
+            self._publish_status()
+
         if not self._initialized_machine_info:
             try:
                 self._machine_info = await self.retrieve_machine_info(
                     self._machine_info
                 )
+                self._publish_status()
             except AuthFail as err:
                 raise err
             except Exception as err:
@@ -173,6 +271,10 @@ class Connection:
             self._cipher = AESCipher(self._machine_info[KEY])
 
         """Connect to the machine."""
+        tracer = self._tracer
+        if tracer.enabled:
+            tracer.event(CONNECT_START, time.monotonic())
+
         try:
             self._reader, self._writer = await asyncio.wait_for(
                 asyncio.open_connection(
@@ -182,11 +284,21 @@ class Connection:
             )
         except asyncio.TimeoutError:
             _LOGGER.warning("Connection Timeout, skipping")
+            self._metrics.inc(CONNECT_FAILURES)
+            if tracer.enabled:
+                tracer.event(CONNECT_END, time.monotonic(), ok=False)
             return None
 
         except Exception as err:
+            self._metrics.inc(CONNECT_FAILURES)
+            if tracer.enabled:
+                tracer.event(CONNECT_END, time.monotonic(), ok=False)
             raise ConnectionFail(f"Cannot connect to machine: {err}") from err
 
+        self._metrics.inc(CONNECTS)
+        if tracer.enabled:
+            tracer.event(CONNECT_END, time.monotonic(), ok=True)
+
         """Start listening for responses."""
         await self.start_read_task()
 
@@ -220,14 +332,21 @@ class Connection:
 
         self._reader = self._writer = None
         self._connected = False
+
+        """Responses to anything outstanding won't arrive now."""
+        self._sent_times.clear()
+        for entries in list(self._inflight_writes.values()):
+            for _, _, future in list(entries):
+                future.cancel()
         _LOGGER.debug("Finished closing")
 
     async def read_reaper(self):
         _LOGGER.debug("Starting read reaper")
-        try:
-            await asyncio.gather(self._read_response_task)
-        except Exception as err:
-            _LOGGER.error(f"Exception in read_response_task: {err}")
+        """Wait without raising, since _close() cancels the task when we disconnect ourselves."""
+        task = self._read_response_task
+        await asyncio.wait([task])
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error(f"Exception in read_response_task: {task.exception()}")
 
         await self._close()
         self._read_response_task = None
@@ -237,14 +356,131 @@ class Connection:
 
     def _call_callbacks(self, **kwargs):
         """Call the callbacks."""
-        if self._callback_list is not None:
+        if self._callback_list:
+            start = time.perf_counter()
             [
                 elem(
-                    current_status=self._current_status,
+                    current_status=self._snapshot.status,
                     **kwargs,
                 )
                 for elem in self._callback_list
             ]
+            self._callbacks_done(start)
+
+    def set_tracer(self, tracer):
+        """Send trace events to a Tracer, or stop tracing if tracer is None."""
+        self._tracer = tracer or NULL_TRACER
+
+    def _callbacks_done(self, start):
+        """Record how long the listeners took."""
+        duration = time.perf_counter() - start
+        self._metrics.observe(CALLBACK_TIME, duration)
+        if self._tracer.enabled:
+            self._tracer.event(CALLBACKS_DISPATCHED, time.monotonic(), duration=duration)
+
+    def start_capture(self, path):
+        """Start appending every plaintext frame to a capture file."""
+        self.stop_capture()
+        self._capture = FrameCapture(path)
+
+    def stop_capture(self):
+        """Stop capturing frames."""
+        if self._capture:
+            self._capture.close()
+            self._capture = None
+
+    def _publish(self, changes):
+        """Publish a new snapshot of the state and tell listeners which values changed."""
+        version = self._snapshot.version + 1
+        for key in changes:
+            self._key_versions[key] = version
+
+        self._snapshot = Snapshot(version, MappingProxyType(self._current_status.copy()))
+        self._call_change_callbacks(changes)
+
+    def _publish_status(self):
+        """Publish whatever has changed since the last snapshot."""
+        status = self._snapshot.status
+        changes = {
+            k: v
+            for k, v in self._current_status.items()
+            if k not in status or status[k] != v
+        }
+        changes.update({k: None for k in status if k not in self._current_status})
+
+        if changes:
+            self._publish(changes)
+
+    def _track_change(self, updates, writes, acks=None):
+        """Show written values right away and check them against the machine in the background.
+
+        writes is a list of (address, data), and acks the futures for their responses, if known.
+        """
+        self._optimistic.add(updates)
+        self._current_status.update(updates)
+
+        task = asyncio.get_event_loop().create_task(
+            self._confirm(list(updates), writes, acks or [])
+        )
+        self._confirm_tasks.add(task)
+        task.add_done_callback(self._confirm_tasks.discard)
+
+    async def _confirm(self, keys, writes, acks):
+        """Re-read just the written regions until the machine confirms the values or the deadline passes."""
+        if acks:
+            await asyncio.wait(acks, timeout=DEFAULT_RESPONSE_TIMEOUT)
+            for future in acks:
+                if not future.done():
+                    self._cancel_response(future)
+                elif not future.cancelled() and future.result() is False:
+                    """The machine rejected the write, so don't wait for it to catch up."""
+                    self._optimistic.expire(keys)
+
+        reads = []
+        for address, data in writes:
+            length = len(data) // 2
+            reads.append(format_region(address, length))
+
+            """Values are only decoded once the whole message they're in is known."""
+            for cur_msg in DECODABLE_MSGS:
+                if (
+                    cur_msg.address < address + length
+                    and address < cur_msg.address + cur_msg.length
+                ):
+                    reads.extend(
+                        format_region(*x)
+                        for x in self._mirror.stale_ranges(
+                            cur_msg.address, cur_msg.length, float("inf")
+                        )
+                    )
+        reads = list(dict.fromkeys(reads))
+
+        try:
+            await self._read(reads)
+
+            deadline = self._optimistic.deadline(keys)
+            if deadline is not None:
+                await asyncio.sleep(max(0, deadline - time.monotonic()))
+                await self._read(reads)
+                self._optimistic.prune()
+        except (ConnectionFail, OSError) as err:
+            _LOGGER.debug(f"Couldn't confirm {keys}: {err}")
+
+    def _call_conflict_callbacks(self, conflicts):
+        """Tell listeners which written values were rolled back, as {key: Conflict}."""
+        self._metrics.inc(CONFLICTS, amount=len(conflicts))
+        for callback in self._conflict_callback_list:
+            callback(conflicts)
+
+    def _call_change_callbacks(self, changes):
+        """Tell listeners which values changed, with None for values that went away."""
+        if not self._change_callback_list:
+            return
+
+        start = time.perf_counter()
+        for callback in self._change_callback_list:
+            callback(changes)
+        self._callbacks_done(start)
 
     async def read_response_task(self):
         """Start thread to receive responses."""
@@ -259,14 +495,38 @@ class Connection:
         while self._run:
             encoded_data = await self._reader.readuntil(separator=b"%")
 
+            tracer = self._tracer
+            if tracer.enabled:
+                tracer.event(FRAME_RECEIVED, time.monotonic())
+
             if encoded_data is not None:
                 loop = asyncio.get_event_loop()
                 fn = partial(self._cipher.decrypt, encoded_data[1:-1])
-                plaintext = await loop.run_in_executor(None, fn)
+                start = time.perf_counter()
+                try:
+                    plaintext = await loop.run_in_executor(None, fn)
+                except ValueError:
+                    self._metrics.inc(ERRORS, DECRYPT_FAILED)
+                    raise
+                decrypted = time.perf_counter()
+                self._metrics.observe(DECRYPT_TIME, decrypted - start)
                 if not plaintext:
                     continue
 
+                if tracer.enabled:
+                    msg_id = find_msg_id(plaintext[0], plaintext[1:9])
+                    tracer.event(
+                        FRAME_DECRYPTED, time.monotonic(), msg_id, plaintext[1:9]
+                    )
+
+                if self._capture:
+                    self._capture.write(INBOUND, plaintext)
+
                 await self.process_data(plaintext)
+                self._metrics.observe(DECODE_TIME, time.perf_counter() - decrypted)
+
+                if tracer.enabled:
+                    tracer.event(FRAME_DECODED, time.monotonic(), msg_id, plaintext[1:9])
 
                 if not self._first_time:
                     if handle:
@@ -300,25 +560,23 @@ class Connection:
         finished = not len(self._responses_waiting)
 
         _LOGGER.debug(f"Message={msg}, Data={data}")
+        self._metrics.inc(FRAMES_IN)
 
         msg_id = None
 
         if msg_type == Msg.WRITE:
             if Msg.RESPONSE_GOOD not in data:
                 _LOGGER.error(f"Command Failed: {msg}: {data}")
+                self._metrics.inc(ERRORS, COMMAND_FAILED)
                 retval = False
             else:
                 _LOGGER.debug(f"Command Succeeded: {msg}: {data}")
+
+                """The machine has new contents for this region, so re-read it next time."""
+                self._mirror.mark_dirty(*parse_region(msg))
         else:
             """Find the matching item or returns None."""
-            msg_id = next(
-                (
-                    x
-                    for x in MSGS
-                    if MSGS[x].msg == msg and MSGS[x].msg_type == msg_type
-                ),
-                None,
-            )
+            msg_id = find_msg_id(msg_type, msg)
 
             if msg_id is not None:
                 cur_msg = MSGS[msg_id]
@@ -330,10 +588,24 @@ class Connection:
                     if MSGS[x[0]].msg == msg
                 ]
 
-                if cur_msg.map is not None:
+                if msg_type == Msg.READ:
+                    if (
+                        await self._update_mirror(msg, data)
+                        and msg_id == Msg.GET_TEMP_REPORT
+                    ):
+                        """Only the reports themselves, not reads that happen to cover them."""
+                        self._temp_history.append(
+                            self._current_status[TEMP_COFFEE],
+                            self._current_status[TEMP_STEAM],
+                        )
+                elif cur_msg.map is not None:
                     await self._populate_items(data, cur_msg)
+            elif msg_type == Msg.READ:
+                """Arbitrary reads still tell us about the machine's memory."""
+                await self._update_mirror(msg, data)
             else:
                 _LOGGER.error(f"Unexpected response: {plaintext}")
+                self._metrics.inc(ERRORS, UNEXPECTED_RESPONSE)
                 retval = False
 
         if msg in self._responses_waiting:
@@ -342,9 +614,58 @@ class Connection:
             if finished:
                 _LOGGER.debug("Received all responses")
 
+        sent_times = self._sent_times.get((msg_type, msg))
+        if sent_times:
+            self._metrics.observe(
+                REQUEST_RTT,
+                time.perf_counter() - sent_times.pop(0),
+                msg_id or find_msg_id(msg_type, msg) or msg,
+            )
+            if not sent_times:
+                del self._sent_times[(msg_type, msg)]
+                if not self._sent_times:
+                    self._answered.set()
+
+        if msg_type == Msg.WRITE:
+            self._acknowledge_write(msg, retval)
+
+        self._resolve_response(msg_type, msg, retval)
+
         return retval
 
-    def calculate_auto_sched_times(self, key):
+    async def _update_mirror(self, msg, data):
+        """Store a read response in the mirror and decode everything it touched, returning False if it was malformed."""
+        address, length = parse_region(msg)
+        try:
+            self._mirror.update(address, data[: length * 2])
+        except ValueError:
+            _LOGGER.error(f"Malformed response: {msg}: {data}")
+            self._metrics.inc(ERRORS, MALFORMED_RESPONSE)
+            return False
+
+        await self._decode_from_mirror(address, length)
+        return True
+
+    async def _decode_from_mirror(self, address, length):
+        """Run the decoders for every known region that overlaps the given one."""
+        for cur_msg in DECODABLE_MSGS:
+            if (
+                cur_msg.address >= address + length
+                or cur_msg.address + cur_msg.length <= address
+            ):
+                continue
+
+            data = self._mirror.read(cur_msg.address, cur_msg.length)
+            if data is None:
+                continue
+
+            await self._populate_items(data, cur_msg)
+
+    def calculate_auto_sched_times(self, key, status=None):
+        """Return the human-readable on and off times for a day, from the hours and minutes in status."""
+        if status is None:
+            status = self._current_status
+
         time_on_key = self._get_key((key, ON, TIME))
         hour_on_key = self._get_key((key, ON, HOUR))
         min_on_key = self._get_key((key, ON, MIN))
@@ -352,35 +673,43 @@ class Connection:
         hour_off_key = self._get_key((key, OFF, HOUR))
         min_off_key = self._get_key((key, OFF, MIN))
 
-        """Set human-readable "on" time"""
-        self._current_status[
-            time_on_key
-        ] = f"{'%02d' % self._current_status[hour_on_key]}:{'%02d' % self._current_status[min_on_key]}"
-
-        """Set human-readable "off" time"""
-        self._current_status[
-            time_off_key
-        ] = f"{'%02d' % self._current_status[hour_off_key]}:{'%02d' % self._current_status[min_off_key]}"
+        return {
+            time_on_key: f"{'%02d' % status[hour_on_key]}:{'%02d' % status[min_on_key]}",
+            time_off_key: f"{'%02d' % status[hour_off_key]}:{'%02d' % status[min_off_key]}",
+        }
 
     async def _populate_items(self, data, cur_msg):
+        optimistic = self._optimistic
+        conflicts = {}
+
         def handle_cached_value(element, value):
-            """See if we've stored a temporary value that may take a while to update on the machine"""
-            if element in self._temp_state:
-                if value == self._temp_state[element]:
-                    """Value has updated, so remove the temp value"""
-                    _LOGGER.debug(
-                        f"Element {element} has updated to {value}, pop the cached value"
-                    )
-                    self._temp_state.pop(element, None)
-                else:
-                    """Value hasn't updated yet, so use the cached value"""
-                    _LOGGER.debug(
-                        f"Element {element} hasn't updated yet, so use the cached value {value}"
-                    )
-                    value = self._temp_state[element]
+            """Show a written value until the machine reports it, or roll it back if it never does."""
+            if not optimistic or element not in optimistic:
+                return value
+
+            value, conflict = optimistic.reconcile(element, value)
+            if conflict is not None:
+                _LOGGER.warning(
+                    f"{element} was written as {conflict.expected} but the machine reports {conflict.reported}"
+                )
+                conflicts[element] = conflict
 
             return value
 
+        changes = {}
+
+        def update(key, value):
+            """Store a value and remember whether it changed."""
+            status = self._current_status
+            if key not in status or status[key] != value:
+                changes[key] = value
+                status[key] = value
+
+        def remove(key):
+            """Drop a value and remember that it went away."""
+            if self._current_status.pop(key, None) is not None:
+                changes[key] = None
+
         """Process all the fields and populate shared dict."""
         map = cur_msg.map
         for elem in map:
@@ -388,42 +717,16 @@ class Connection:
 
             """Don't decode a value if we just plan to calculate it"""
             if elem.index != CALCULATED_VALUE:
-                """The strings are ASCII-encoded hex, so each value takes 2 bytes."""
-                index = elem.index * 2
-                size = elem.size * 2
-
-                """Extract value for this field."""
-                value = data[index : index + size]
-
-                if elem.type == Elem.INT:
-                    """Convert from ascii-encoded hex."""
-                    value = int(value, 16)
+                value = extract(data, elem)
 
             raw_key = map[elem]
 
             """Construct key name if needed."""
             key = self._get_key(raw_key)
 
-            if any(x in key for x in DIVIDE_KEYS):
-                value = value / 10
-            elif key == FIRMWARE_VER:
-                value = "%0.2f" % (value / 100)
-            elif key in SERIAL_NUMBERS:
-                value = "".join(
-                    [chr(int(value[i : i + 2], 16)) for i in range(0, len(value), 2)]
-                )
-                """Chop off any trailing nulls."""
-                value = value.partition("\0")[0]
-
-            elif key == AUTO_BITFIELD:
-                bitfield = value
-                for item in AUTO_BITFIELD_MAP:
-                    setting = ENABLED if bitfield & 0x01 else DISABLED
-                    processed_key = self._get_key(AUTO_BITFIELD_MAP[item])
-                    self._current_status[processed_key] = handle_cached_value(
-                        processed_key, setting
-                    )
-                    bitfield = bitfield >> 1
+            if key == AUTO_BITFIELD:
+                for processed_key, setting in expand_bitfield(value).items():
+                    update(processed_key, handle_cached_value(processed_key, setting))
             elif raw_key in DRINK_OFFSET_MAP:
                 if key == TOTAL_FLUSHING:
                     value = (
@@ -433,19 +736,14 @@ class Connection:
                 offset_key = self._get_key(DRINK_OFFSET_MAP[raw_key])
                 if key not in self._current_status:
                     """If we haven't seen the value before, calculate the offset."""
-                    self._current_status.update(
-                        {offset_key: value - self._current_status.get(offset_key, 0)}
-                    )
+                    update(offset_key, value - self._current_status.get(offset_key, 0))
                 """Apply the offset to the value."""
                 value = value - self._current_status.get(offset_key, 0)
-            elif key == DAYS_SINCE_BUILT:
-                """Convert hours to days."""
-                value = round(value / 24)
             elif key == HEATING_STATE:
-                value = [x for x in HEATING_VALUES if HEATING_VALUES[x] & value]
+                value = convert(key, value)
                 """Don't add attribute and remove it if machine isn't currently running."""
                 if not value:
-                    self._current_status.pop(key, None)
+                    remove(key)
                     continue
             elif key == BREW_GROUP_OFFSET:
                 value = (value & 0xFF00) >> 8 | (value & 0x00FF) << 8
@@ -464,28 +762,17 @@ class Connection:
             elif key in [KEY_ACTIVE, CURRENT_PULSE_COUNT]:
                 """Don't add attributes and remove them if machine isn't currently running."""
                 if not value:
-                    self._current_status.pop(key, None)
+                    remove(key)
                     continue
-            elif key == FRONT_PANEL_DISPLAY:
-                value = (
-                    bytes.fromhex(value)
-                    .decode("latin-1")
-                    .replace("\xdf", "\u00b0")  # Degree symbol
-                    .replace(
-                        "\xdb", "\u25A1"
-                    )  # turn a block into an outline block (heating element off)
-                    .replace(
-                        "\xff", "\u25A0"
-                    )  # turn \xff into a solid block (heating element on)
-                )
             elif elem.index == CALCULATED_VALUE and key in AUTO_SCHED_MAP.values():
-                self.calculate_auto_sched_times(key)
+                for time_key, value in self.calculate_auto_sched_times(key).items():
+                    update(time_key, value)
                 continue
-            elif key == STEAM_BOILER_ENABLE:
-                value = (value & 0x01) == 1
             elif elem.index == CALCULATED_VALUE and key in [ENABLE_PREBREWING, ENABLE_PREINFUSION]:
                 state = self._current_status.get(PREBREW_FLAG)
                 value = state == (1 if key == ENABLE_PREBREWING else 2)
+            else:
+                value = convert(key, value)
 
             if key == TEMP_COFFEE:
                 # The offset is used to set the boiler temp to achieve the
@@ -493,23 +780,298 @@ class Connection:
                 # group temp
                 value = round(value - self._current_status.get(BREW_GROUP_OFFSET, 0), 1)
 
-            self._current_status[key] = handle_cached_value(key, value)
+            update(key, handle_cached_value(key, value))
+
+        if changes:
+            self._publish(changes)
+
+        if conflicts:
+            self._call_conflict_callbacks(conflicts)
 
     async def _send_msg(self, msg_id, data=None, base=None):
         """Send command to the espresso machine."""
         msg = MSGS[msg_id]
 
+        if msg.msg_type == Msg.READ and data is None and not base:
+            """Serve fresh reads from the mirror, unless a raw callback needs the frame itself."""
+            if self._mirror.is_fresh(msg.address, msg.length) and not any(
+                x[0] == msg_id for x in self._raw_callback_list
+            ):
+                await self._decode_from_mirror(msg.address, msg.length)
+                self._call_callbacks()
+                return
+
+            _, reads = self._join_reads([msg.msg])
+            await self._send_reads(reads)
+            return
+
         _LOGGER.debug(f"Sending {msg.msg} with {data} {base}")
         await self._send_raw_msg(msg.msg, msg.msg_type, data, base)
 
+    def _join_reads(self, msgs, timeout=DEFAULT_RESPONSE_TIMEOUT):
+        """Return a future for each read, and the reads that aren't already in flight and need sending."""
+        futures = []
+        reads = []
+        loop = asyncio.get_event_loop()
+
+        for msg in msgs:
+            future = self._inflight_reads.get(msg)
+            if future is None:
+                future = self._expect_response(Msg.READ, msg)
+                self._inflight_reads[msg] = future
+                future.add_done_callback(partial(self._read_done, msg))
+                loop.call_later(
+                    timeout + (self._lease_period or 0), self._expire_read, future
+                )
+                reads.append(msg)
+            futures.append(future)
+
+        return futures, reads
+
+    def _read_done(self, msg, future):
+        """The read has been answered, or given up on."""
+        if self._inflight_reads.get(msg) is future:
+            del self._inflight_reads[msg]
+
+    def _expire_read(self, future):
+        """Give up on a read that hasn't been answered."""
+        if not future.done():
+            self._cancel_response(future)
+
+    async def _send_reads(self, reads):
+        """Send the reads returned by _join_reads, giving up on them if that fails."""
+        if not reads:
+            return
+
+        futures = [self._inflight_reads[x] for x in reads]
+        try:
+            await self._send_raw_msgs([(x, Msg.READ, None) for x in reads])
+        except Exception:
+            for future in futures:
+                self._cancel_response(future)
+            raise
+
+    async def _read(self, msgs, timeout=DEFAULT_RESPONSE_TIMEOUT):
+        """Read regions, sharing any identical reads in flight, and return True if they all succeeded."""
+        futures, reads = self._join_reads(msgs, timeout)
+        await self._send_reads(reads)
+
+        await asyncio.wait(futures)
+        return all(not x.cancelled() and x.result() for x in futures)
+
+    def is_response(self, msg_type, msg):
+        """Return whether a frame being received answers something we sent, rather than arriving unsolicited."""
+        return bool(self._sent_times.get((msg_type, msg)))
+
+    async def forward_read(self, msg, timeout=DEFAULT_RESPONSE_TIMEOUT):
+        """Read a region for another client, from the mirror if it's fresh, and return its data or None if the machine didn't answer."""
+        address, length = parse_region(msg)
+        if not self._mirror.is_fresh(address, length):
+            if not await self._read([msg], timeout):
+                return None
+
+        return self._mirror.read(address, length)
+
+    async def forward_write(self, msg, data, timeout=DEFAULT_RESPONSE_TIMEOUT):
+        """Write a region for another client and return whether the machine accepted it, or None if it didn't answer."""
+        future = self._expect_response(Msg.WRITE, msg)
+        try:
+            await self._send_raw_msgs([(msg, Msg.WRITE, data)])
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._cancel_response(future)
+            return None
+        except Exception:
+            self._cancel_response(future)
+            raise
+
     async def _send_raw_msg(self, msg, msg_type, data=None, base=None):
-        def checksum(buffer):
-            """Compute check byte."""
-            buffer = bytes(buffer, "utf-8")
-            return "%0.2X" % (sum(buffer) % 256)
+        """If a key was provided, replace the second byte of the message."""
+        msg_to_send = msg if not base else msg[:2] + base + msg[4:]
+
+        await self._send_raw_msgs([(msg_to_send, msg_type, data)])
+
+    async def _send_raw_msgs(self, frames):
+        """Send a burst of (msg, msg_type, data) frames, or queue it for the next lease window."""
+        if self._lease_period is None:
+            await self._write_frames(frames)
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        self._leased.append((frames, future))
+        if self._lease_task is None:
+            self._lease_task = asyncio.get_event_loop().create_task(
+                self._lease_loop(), name="Lease Task"
+            )
+
+        """Return once the burst has been written, like an immediate send."""
+        await future
+
+    def _set_lease_period(self, period):
+        """Hold the connection only in short windows every period seconds, or connect as needed if None."""
+        self._lease_period = period
+
+    async def _lease_loop(self):
+        """Open a lease window every period for as long as there's work queued."""
+        try:
+            while self._lease_period is not None and self._leased:
+                await asyncio.sleep(self._lease_period)
+                await self._flush_lease()
+        finally:
+            self._lease_task = None
+
+        """Lease mode was turned off while bursts were waiting."""
+        if self._leased:
+            await self._flush_lease()
+
+    async def _flush_lease(self):
+        """Connect, send everything queued in one burst, wait for the responses and disconnect."""
+        leased, self._leased = self._leased, []
+        if not leased:
+            return
+
+        """Writes go first so that reads in the same window see them."""
+        frames = [x for burst, _ in leased for x in burst if x[1] != Msg.READ]
+        frames += [x for burst, _ in leased for x in burst if x[1] == Msg.READ]
+
+        self._answered.clear()
+        try:
+            await self._write_frames(frames)
+        except Exception as err:
+            for _, future in leased:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        for _, future in leased:
+            if not future.done():
+                future.set_result(None)
+
+        try:
+            await asyncio.wait_for(self._answered.wait(), DEFAULT_RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.warning(f"Lease window ended without all responses: {self._sent_times}")
+
+        """If lease mode was turned off meanwhile, leave the connection to time out as usual."""
+        if self._lease_period is not None:
+            await self._close()
+
+    async def _stop_confirming(self):
+        """Stop checking written values, leaving them to be reconciled by the next read."""
+        tasks = list(self._confirm_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def _stop_lease(self):
+        """Stop the lease task and fail anything still queued."""
+        if self._lease_task is not None:
+            self._lease_task.cancel()
+            await asyncio.wait([self._lease_task])
+
+        leased, self._leased = self._leased, []
+        for _, future in leased:
+            if not future.done():
+                future.set_exception(ConnectionFail("Connection closed"))
+
+    async def _write_frames(self, frames):
+        """Send a burst of (msg, msg_type, data) frames, pipelined with writes that don't overlap it."""
+
+        """Writes from the user go ahead of polls, and only one burst is sent at a time."""
+        priority = (
+            PRIORITY_WRITE
+            if any(x[1] != Msg.READ for x in frames)
+            else PRIORITY_POLL
+        )
+
+        if priority == PRIORITY_WRITE:
+            await self._wait_for_overlapping_writes(frames)
+
+        writes = self._track_writes(frames)
+        try:
+            await self._send_burst(frames, priority)
+        except BaseException:
+            for future in writes:
+                future.cancel()
+            raise
+
+    def _overlapping_writes(self, frames):
+        """Return the futures of unacknowledged writes that overlap any write in the frames."""
+        regions = [parse_region(x[0]) for x in frames if x[1] == Msg.WRITE]
+        return [
+            future
+            for entries in self._inflight_writes.values()
+            for address, length, future in entries
+            if any(address < x + y and x < address + length for x, y in regions)
+        ]
+
+    async def _wait_for_overlapping_writes(self, frames):
+        """Wait until the machine has acknowledged every earlier write to the same addresses."""
+        loop = asyncio.get_event_loop()
+
+        """An earlier write may wait for its lease window before it's answered."""
+        deadline = loop.time() + DEFAULT_RESPONSE_TIMEOUT + (self._lease_period or 0)
+
+        while futures := self._overlapping_writes(frames):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                _LOGGER.warning("Sending a write before an overlapping one was acknowledged")
+                return
+
+            await asyncio.wait(futures, timeout=remaining)
+
+    def _track_writes(self, frames):
+        """Note the writes in a burst as unacknowledged, and return a future for each."""
+        loop = asyncio.get_event_loop()
+        futures = []
+
+        for msg, msg_type, _ in frames:
+            if msg_type != Msg.WRITE:
+                continue
+
+            future = loop.create_future()
+            entry = (*parse_region(msg), future)
+            self._inflight_writes.setdefault(msg, []).append(entry)
+            future.add_done_callback(partial(self._write_done, msg, entry))
+            loop.call_later(
+                DEFAULT_RESPONSE_TIMEOUT + (self._lease_period or 0), future.cancel
+            )
+            futures.append(future)
+
+        return futures
+
+    def _write_done(self, msg, entry, future):
+        """The write has been acknowledged, or given up on."""
+        entries = self._inflight_writes.get(msg)
+        if entries and entry in entries:
+            entries.remove(entry)
+            if not entries:
+                del self._inflight_writes[msg]
+
+    def _acknowledge_write(self, msg, ok):
+        """Match a write response to the oldest unacknowledged write of that message."""
+        entries = self._inflight_writes.get(msg)
+        if entries:
+            future = entries[0][2]
+            if not future.done():
+                future.set_result(ok)
+
+    async def _send_burst(self, frames, priority):
+        """Send a burst of frames with a single connect and drain once it's our turn."""
+
+        def encrypt(plaintexts):
+            """Encrypt and frame everything in one go."""
+            return b"".join(b"@" + self._cipher.encrypt(x) + b"%" for x in plaintexts)
+
+        queued = time.monotonic()
+
+        async with self._scheduler.turn(priority):
+            if priority == PRIORITY_POLL:
+                frames = await self._drop_answered_reads(frames, queued)
+                if not frames:
+                    return
 
-        """Prevent race conditions - can be called from different tasks."""
-        async with self._lock:
             """Connect if we don't have an active connection."""
             result = await self._connect()
 
@@ -519,32 +1081,100 @@ class Connection:
             if not self._writer:
                 raise ConnectionFail(f"self._writer={self._writer}")
 
-            """If a key was provided, replace the second byte of the message."""
-            msg_to_send = msg if not base else msg[:2] + base + msg[4:]
+            plaintexts = []
+            for msg, msg_type, data in frames:
+                plaintext = msg_type + msg
 
-            plaintext = msg_type + msg_to_send
+                if data is not None:
+                    plaintext += data
 
-            if data is not None:
-                plaintext += data
+                """Add the check byte."""
+                plaintext += checksum(plaintext)
+                plaintexts.append(plaintext)
 
-            """Add the check byte."""
-            plaintext += checksum(plaintext)
+                if self._capture:
+                    self._capture.write(OUTBOUND, plaintext)
 
             loop = asyncio.get_event_loop()
-            fn = partial(self._cipher.encrypt, plaintext)
-            ciphertext = (
-                "@" + (await loop.run_in_executor(None, fn)).decode("utf-8") + "%"
-            )
+            fn = partial(encrypt, plaintexts)
+            ciphertext = await loop.run_in_executor(None, fn)
+
+            tracer = self._tracer
+            if tracer.enabled:
+                now = time.monotonic()
+                for msg, msg_type, data in frames:
+                    tracer.event(FRAME_ENCODED, now, find_msg_id(msg_type, msg), msg)
 
-            self._writer.write(bytes(ciphertext, "utf-8"))
+            self._writer.write(ciphertext)
             await self._writer.drain()
 
+            if tracer.enabled:
+                now = time.monotonic()
+                for msg, msg_type, data in frames:
+                    tracer.event(FRAME_WRITTEN, now, find_msg_id(msg_type, msg), msg)
+
+            now = time.perf_counter()
+            for msg, msg_type, data in frames:
+                self._sent_times.setdefault((msg_type, msg), []).append(now)
+            self._metrics.inc(FRAMES_OUT, amount=len(frames))
+
             """Remember that we're waiting for a response."""
-            self._responses_waiting.append(msg_to_send)
+            self._responses_waiting.extend(x[0] for x in frames)
 
             """Note when the command was sent."""
             self._start_time = datetime.now()
 
+    async def _drop_answered_reads(self, frames, queued):
+        """Drop reads whose region has been read since they were queued, and return the rest."""
+        now = time.monotonic()
+        remaining = []
+
+        raw_msg_ids = [x[0] for x in self._raw_callback_list]
+
+        for frame in frames:
+            address, length = parse_region(frame[0])
+            if not self._mirror.is_fresh(
+                address, length, now - queued
+            ) or find_msg_id(Msg.READ, frame[0]) in raw_msg_ids:
+                """Raw callbacks need the frame itself."""
+                remaining.append(frame)
+                continue
+
+            _LOGGER.debug(f"Dropping {frame[0]}, it was read while waiting")
+            self._metrics.inc(POLLS_DROPPED)
+            await self._decode_from_mirror(address, length)
+            self._resolve_response(Msg.READ, frame[0], True)
+
+        return remaining
+
+    def _expect_response(self, msg_type, msg):
+        """Return a future that resolves with the result of the next response to a message."""
+        future = asyncio.get_event_loop().create_future()
+        self._response_futures.setdefault((msg_type, msg), []).append(future)
+        return future
+
+    def _cancel_response(self, future):
+        """Stop waiting for a response."""
+        for key, futures in list(self._response_futures.items()):
+            if future in futures:
+                futures.remove(future)
+                if not futures:
+                    del self._response_futures[key]
+        future.cancel()
+
+    def _resolve_response(self, msg_type, msg, result):
+        """Hand the result of a response to the oldest future waiting for it."""
+        futures = self._response_futures.get((msg_type, msg))
+        if not futures:
+            return
+
+        future = futures.pop(0)
+        if not futures:
+            del self._response_futures[(msg_type, msg)]
+
+        if not future.done():
+            future.set_result(result)
+
 
 class AuthFail(Exception):
     """Error to indicate there is invalid auth info."""
@@ -0,0 +1,116 @@
+"""Stateless decoding of message payloads."""
+from .const import CALCULATED_VALUE, DISABLED, ENABLED
+from .msgs import (
+    AUTO_BITFIELD,
+    AUTO_BITFIELD_MAP,
+    DAYS_SINCE_BUILT,
+    DIVIDE_KEYS,
+    FIRMWARE_VER,
+    FRONT_PANEL_DISPLAY,
+    HEATING_STATE,
+    HEATING_VALUES,
+    MSGS,
+    SERIAL_NUMBERS,
+    STEAM_BOILER_ENABLE,
+    Elem,
+)
+
+"""Look up a message id from the type and "AAAALLLL" message of a frame."""
+MSG_IDS = {(v.msg_type, v.msg): k for k, v in MSGS.items()}
+
+
+"""Tag names that have been constructed, so that every machine shares one copy of each."""
+_KEYS = {}
+
+
+def get_key(k):
+    """Construct tag name if needed."""
+    if isinstance(k, tuple):
+        key = _KEYS.get(k)
+        if key is None:
+            key = _KEYS[k] = "_".join(k)
+        return key
+    return k
+
+
+def find_msg_id(msg_type, msg):
+    """Return the id of a known message, or None."""
+    return MSG_IDS.get((msg_type, msg))
+
+
+def extract(data, elem):
+    """Extract the raw value for a field from ASCII-encoded hex data."""
+
+    """The strings are ASCII-encoded hex, so each value takes 2 bytes."""
+    index = elem.index * 2
+    value = data[index : index + elem.size * 2]
+
+    if elem.type == Elem.INT:
+        """Convert from ascii-encoded hex."""
+        value = int(value, 16)
+
+    return value
+
+
+def convert(key, value):
+    """Apply the scaling rules that don't depend on any other state."""
+    if any(x in key for x in DIVIDE_KEYS):
+        value = value / 10
+    elif key == FIRMWARE_VER:
+        value = "%0.2f" % (value / 100)
+    elif key in SERIAL_NUMBERS:
+        value = "".join(
+            [chr(int(value[i : i + 2], 16)) for i in range(0, len(value), 2)]
+        )
+        """Chop off any trailing nulls."""
+        value = value.partition("\0")[0]
+    elif key == DAYS_SINCE_BUILT:
+        """Convert hours to days."""
+        value = round(value / 24)
+    elif key == HEATING_STATE:
+        value = [x for x in HEATING_VALUES if HEATING_VALUES[x] & value]
+    elif key == FRONT_PANEL_DISPLAY:
+        value = (
+            bytes.fromhex(value)
+            .decode("latin-1")
+            .replace("\xdf", "\u00b0")  # Degree symbol
+            .replace(
+                "\xdb", "\u25A1"
+            )  # turn a block into an outline block (heating element off)
+            .replace(
+                "\xff", "\u25A0"
+            )  # turn \xff into a solid block (heating element on)
+        )
+    elif key == STEAM_BOILER_ENABLE:
+        value = (value & 0x01) == 1
+
+    return value
+
+
+def expand_bitfield(bitfield):
+    """Return the per-day auto on/off settings from the bitfield."""
+    result = {}
+    for item in AUTO_BITFIELD_MAP:
+        result[get_key(AUTO_BITFIELD_MAP[item])] = (
+            ENABLED if bitfield & 0x01 else DISABLED
+        )
+        bitfield = bitfield >> 1
+    return result
+
+
+def decode(cur_msg, data):
+    """Decode every field of a message that doesn't need the machine's other state."""
+    result = {}
+
+    for elem, raw_key in cur_msg.map.items():
+        if elem.index == CALCULATED_VALUE:
+            continue
+
+        key = get_key(raw_key)
+        value = convert(key, extract(data, elem))
+        result[key] = value
+
+        if key == AUTO_BITFIELD:
+            result.update(expand_bitfield(value))
+
+    return result
@@ -0,0 +1,180 @@
+"""Water flow stream decoding and shot aggregation."""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+from .msgs import FLOW_KEY, FLOW_PULSES, FLOW_RATE, FLOW_SECONDS, WATER_FLOW_MAP, Msg
+
+_LOGGER = logging.getLogger(__name__)
+
+"""Number of samples buffered for a slow consumer before the oldest are dropped."""
+DEFAULT_QUEUE_SIZE = 1000
+
+"""A shot is finished if no flow samples arrive for this many seconds."""
+DEFAULT_IDLE_TIMEOUT = 3
+
+"""A single decoded 'Z' frame. timestamp is time.monotonic() when it was received."""
+FlowSample = namedtuple("FlowSample", ["key", "rate", "seconds", "pulses", "timestamp"])
+
+"""A completed shot. curve is a list of (seconds, pulses, rate) tuples."""
+Shot = namedtuple(
+    "Shot", ["key", "started", "duration", "pulses", "samples", "curve"]
+)
+
+"""Offsets of the flow fields, taken from the message map."""
+_FIELDS = {value: elem for elem, value in WATER_FLOW_MAP.items()}
+
+
+def _field(data, name):
+    """Extract an integer field from ASCII-encoded hex data."""
+    elem = _FIELDS[name]
+    index = elem.index * 2
+    return int(data[index : index + elem.size * 2], 16)
+
+
+def decode_flow(data, timestamp=None):
+    """Decode the data portion of a water flow frame into a FlowSample."""
+
+    """Upper 12 bits are whole seconds, lower 4 bits are sixteenths."""
+    seconds = _field(data, FLOW_SECONDS)
+    seconds = (seconds >> 4) + (seconds & 0x0F) / 16
+
+    return FlowSample(
+        _field(data, FLOW_KEY),
+        _field(data, FLOW_RATE),
+        seconds,
+        _field(data, FLOW_PULSES),
+        time.monotonic() if timestamp is None else timestamp,
+    )
+
+
+class FlowStream:
+    """Async iterator of FlowSamples received from the machine."""
+
+    def __init__(self, lmdirect, maxsize=DEFAULT_QUEUE_SIZE):
+        self._lmdirect = lmdirect
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+        self._dropped = 0
+
+        self._key = (Msg.GET_WATER_FLOW, self._on_frame)
+        lmdirect.register_raw_callback(*self._key)
+
+    @property
+    def dropped(self):
+        """Return the number of samples dropped because the consumer fell behind."""
+        return self._dropped
+
+    async def _on_frame(self, key, data):
+        """Raw callback for water flow frames."""
+        try:
+            sample = decode_flow(data)
+        except ValueError:
+            _LOGGER.error(f"Malformed flow frame: {data}")
+            return
+
+        if self._queue.full():
+            """Keep the newest data."""
+            self._queue.get_nowait()
+            self._dropped += 1
+
+        self._queue.put_nowait(sample)
+
+    def close(self):
+        """Stop receiving samples and end the iteration."""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._lmdirect.deregister_raw_callback(self._key)
+
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        sample = await self._queue.get()
+        if sample is None:
+            raise StopAsyncIteration
+        return sample
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ShotAggregator:
+    """Groups flow samples into completed shots."""
+
+    def __init__(self, samples=None, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """samples is an optional async iterator of FlowSamples, e.g. a FlowStream."""
+        self._samples = samples
+        self._idle_timeout = idle_timeout
+        self._current = []
+
+    def add(self, sample):
+        """Add a sample and return the previous shot if this one starts a new shot."""
+        shot = None
+
+        if self._current:
+            last = self._current[-1]
+            if (
+                sample.key != last.key
+                or sample.seconds < last.seconds
+                or sample.timestamp - last.timestamp > self._idle_timeout
+            ):
+                shot = self.flush()
+
+        self._current.append(sample)
+        return shot
+
+    def flush(self):
+        """Finish the shot in progress and return it, or None if there isn't one."""
+        if not self._current:
+            return None
+
+        samples, self._current = self._current, []
+        first, last = samples[0], samples[-1]
+
+        return Shot(
+            first.key,
+            first.timestamp,
+            last.seconds,
+            last.pulses,
+            len(samples),
+            [(x.seconds, x.pulses, x.rate) for x in samples],
+        )
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._samples is None:
+            raise StopAsyncIteration
+
+        while True:
+            try:
+                sample = await asyncio.wait_for(
+                    self._samples.__anext__(), timeout=self._idle_timeout
+                )
+            except asyncio.TimeoutError:
+                """Flow stopped, so the shot is done."""
+                shot = self.flush()
+                if shot is not None:
+                    return shot
+                continue
+            except StopAsyncIteration:
+                shot = self.flush()
+                if shot is not None:
+                    return shot
+                raise
+
+            shot = self.add(sample)
+            if shot is not None:
+                return shot
@@ -0,0 +1,322 @@
+"""HTTP gateway that serves the state of many machines to many clients."""
+import asyncio
+import json
+import logging
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+from . import InvalidInput, NotReady
+from .connection import ConnectionFail
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+
+"""Longest a long-poll request waits for a change, in seconds."""
+MAX_WAIT = 60
+
+"""Services that clients can call by POSTing to /machines/<name>/<service>, besides profile."""
+SERVICES = [
+    "set_power",
+    "set_auto_on_off_enable",
+    "set_auto_on_off_global",
+    "set_auto_on_off_times",
+    "set_dose",
+    "set_dose_hot_water",
+    "set_prebrew_times",
+    "set_preinfusion_time",
+    "set_coffee_temp",
+    "set_steam_temp",
+    "set_prebrewing_enable",
+    "set_preinfusion_enable",
+    "set_steam_boiler_enable",
+    "set_start_backflush",
+]
+
+STATUS_TEXT = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class _Machine:
+    """Wakes up long-polls when a machine's state changes."""
+
+    def __init__(self, lmdirect):
+        self.lmdirect = lmdirect
+        self.changed = asyncio.Event()
+        lmdirect.register_change_callback(self.on_change)
+
+    def on_change(self, changes):
+        """Change callback: wake up the long-polls and get ready for the next change."""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def close(self):
+        self.lmdirect.deregister_change_callback(self.on_change)
+
+
+class Gateway:
+    """Serves current_status as JSON with version ETags, long-polls for changes, and calls services."""
+
+    def __init__(self, machines, host="0.0.0.0", port=DEFAULT_PORT, poll_interval=None):
+        """machines maps a name to an LMDirect. With poll_interval, the gateway requests status itself."""
+        self._machines = {name: _Machine(x) for name, x in machines.items()}
+        self._host = host
+        self._port = port
+        self._poll_interval = poll_interval
+        self._server = None
+        self._poll_task = None
+
+    @property
+    def port(self):
+        """Return the port that the gateway is listening on."""
+        return self._port
+
+    async def start(self):
+        """Start serving."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self._host, self._port
+        )
+        self._port = self._server.sockets[0].getsockname()[1]
+
+        if self._poll_interval:
+            self._poll_task = asyncio.get_event_loop().create_task(self._poll())
+
+        return self
+
+    async def close(self):
+        """Stop serving."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        for machine in self._machines.values():
+            machine.close()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _poll(self):
+        """Request status from every machine, once for all clients."""
+        while True:
+            results = await asyncio.gather(
+                *[x.lmdirect.request_status() for x in self._machines.values()],
+                return_exceptions=True,
+            )
+            for name, result in zip(self._machines, results):
+                if isinstance(result, Exception):
+                    _LOGGER.warning(f"Failed to request status from {name}: {result}")
+
+            await asyncio.sleep(self._poll_interval)
+
+    async def _handle_connection(self, reader, writer):
+        """Serve requests on a keep-alive connection."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                if body is None:
+                    self._write_response(
+                        writer, 400, {"error": "Invalid Content-Length"}, {}
+                    )
+                    await writer.drain()
+                    break
+
+                try:
+                    status, payload, extra = await self._route(method, target, headers, body)
+                except Exception as err:
+                    _LOGGER.error(f"Error handling {method} {target}: {err}")
+                    status, payload, extra = 500, {"error": str(err)}, {}
+
+                self._write_response(writer, status, payload, extra)
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Return (method, target, headers, body), or None at the end of the connection. body is None if its length is invalid."""
+        line = await reader.readline()
+        if not line:
+            return None
+
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            """The body can't be skipped, so the caller answers and drops the connection."""
+            return method, target, headers, None
+
+        body = await reader.readexactly(length) if length else b""
+
+        return method, target, headers, body
+
+    def _write_response(self, writer, status, payload, extra):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Length: {len(body)}",
+        ]
+        if payload is not None:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{k}: {v}" for k, v in extra.items())
+
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def _route(self, method, target, headers, body):
+        """Return (status, payload, extra headers) for a request."""
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [x for x in url.path.split("/") if x]
+
+        if not parts or parts[0] != "machines":
+            return 404, {"error": "Not found"}, {}
+
+        if len(parts) == 1:
+            return 200, list(self._machines), {}
+
+        machine = self._machines.get(parts[1])
+        if machine is None:
+            return 404, {"error": f"No machine named {parts[1]}"}, {}
+
+        if len(parts) == 2:
+            if method != "GET":
+                return 405, {"error": "Use GET"}, {}
+            return self._get_status(machine, headers)
+
+        if len(parts) == 3 and parts[2] == "changes":
+            if method != "GET":
+                return 405, {"error": "Use GET"}, {}
+            return await self._get_changes(machine, query)
+
+        if len(parts) == 3 and method == "POST":
+            return await self._call(machine, parts[2], body)
+
+        return 404, {"error": "Not found"}, {}
+
+    def _get_status(self, machine, headers):
+        version, status = machine.lmdirect.snapshot
+        etag = f'"{version}"'
+        if headers.get("if-none-match") == etag:
+            return 304, None, {"ETag": etag}
+
+        return 200, dict(status), {"ETag": etag}
+
+    async def _get_changes(self, machine, query):
+        try:
+            since = int(query.get("since", ["0"])[0])
+            wait = min(float(query.get("wait", ["0"])[0]), MAX_WAIT)
+        except ValueError:
+            return 400, {"error": "since and wait must be numbers"}, {}
+
+        lmdirect = machine.lmdirect
+        if not lmdirect.changed_since(since) and wait > 0:
+            try:
+                await asyncio.wait_for(machine.changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+        version = lmdirect.version
+        etag = f'"{version}"'
+        if version <= since:
+            return 304, None, {"ETag": etag}
+
+        return (
+            200,
+            {"version": version, "changes": lmdirect.changes_since(since)},
+            {"ETag": etag},
+        )
+
+    async def _call(self, machine, service, body):
+        try:
+            kwargs = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "Body must be JSON"}, {}
+
+        if not isinstance(kwargs, dict):
+            return 400, {"error": "Body must be a JSON object"}, {}
+
+        if service == "profile":
+            call = machine.lmdirect.apply_profile(kwargs)
+        elif service in SERVICES:
+            try:
+                call = getattr(machine.lmdirect, service)(**kwargs)
+            except TypeError as err:
+                return 400, {"error": str(err)}, {}
+        else:
+            return 404, {"error": f"No service named {service}"}, {}
+
+        try:
+            result = await call
+        except InvalidInput as err:
+            return 400, {"error": str(err)}, {}
+        except (NotReady, ConnectionFail) as err:
+            return 503, {"error": str(err)}, {}
+
+        if service == "profile":
+            return (
+                200,
+                {
+                    "changed": result.changed,
+                    "results": [x._asdict() for x in result.results],
+                },
+                {},
+            )
+
+        return 200, {"ok": True}, {}
+
+
+async def _main(port, poll_interval):
+    from . import LMDirect
+
+    with open("config.json") as config_file:
+        machine_info = json.load(config_file)
+
+    machines = {machine_info.get("machine_name", "machine"): LMDirect(machine_info)}
+    async with Gateway(machines, port=port, poll_interval=poll_interval) as gateway:
+        print(f"Serving {list(machines)} on port {gateway.port}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        _main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT,
+            float(sys.argv[2]) if len(sys.argv) > 2 else 20,
+        )
+    )
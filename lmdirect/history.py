@@ -0,0 +1,138 @@
+"""Bounded history of temperature samples."""
+import time
+from array import array
+
+"""Enough for well over ten minutes of temperature reports."""
+DEFAULT_SIZE = 4096
+
+COFFEE = "coffee"
+STEAM = "steam"
+
+
+class TempHistory:
+    """Fixed-size, array-backed ring buffer of (timestamp, coffee, steam) samples.
+
+    Timestamps are time.monotonic() seconds, so they stay in order when the wall clock jumps.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self._size = size
+        self._times = array("d", bytes(8 * size))
+        self._coffee = array("d", bytes(8 * size))
+        self._steam = array("d", bytes(8 * size))
+
+        """Index of the next slot to write and number of valid samples."""
+        self._head = 0
+        self._count = 0
+
+    @property
+    def size(self):
+        """Return the maximum number of samples kept."""
+        return self._size
+
+    def __len__(self):
+        return self._count
+
+    def append(self, coffee, steam, timestamp=None):
+        """Add a sample, overwriting the oldest one when full."""
+        head = self._head
+        self._times[head] = time.monotonic() if timestamp is None else timestamp
+        self._coffee[head] = coffee
+        self._steam[head] = steam
+
+        self._head = (head + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def clear(self):
+        """Drop all samples."""
+        self._head = self._count = 0
+
+    def _slot(self, i):
+        """Map a chronological index to a slot in the arrays."""
+        return (self._head - self._count + i) % self._size
+
+    def _first_since(self, since):
+        """Binary search for the chronological index of the first sample at or after since."""
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._times[self._slot(mid)] < since:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def window(self, seconds=None, now=None):
+        """Return the (timestamp, coffee, steam) samples from the last N seconds, oldest first."""
+        start = 0
+        if seconds is not None:
+            start = self._first_since(
+                (time.monotonic() if now is None else now) - seconds
+            )
+
+        return [
+            (self._times[x], self._coffee[x], self._steam[x])
+            for x in map(self._slot, range(start, self._count))
+        ]
+
+    def stats(self, seconds=None, now=None):
+        """Return {coffee: (min, max, mean), steam: (min, max, mean)} for the last N seconds."""
+        start = 0
+        if seconds is not None:
+            start = self._first_since(
+                (time.monotonic() if now is None else now) - seconds
+            )
+
+        slots = [self._slot(x) for x in range(start, self._count)]
+        if not slots:
+            return None
+
+        result = {}
+        for name, values in [(COFFEE, self._coffee), (STEAM, self._steam)]:
+            selected = [values[x] for x in slots]
+            result[name] = (
+                min(selected),
+                max(selected),
+                sum(selected) / len(selected),
+            )
+
+        return result
+
+    def latest(self):
+        """Return the newest (timestamp, coffee, steam) sample, or None if empty."""
+        if not self._count:
+            return None
+
+        slot = self._slot(self._count - 1)
+        return self._times[slot], self._coffee[slot], self._steam[slot]
+
+    def segments(self):
+        """Return the samples as up to two chronological (times, coffee, steam) NumPy views without copying."""
+        import numpy as np
+
+        views = [
+            np.frombuffer(x, dtype=np.float64)
+            for x in [self._times, self._coffee, self._steam]
+        ]
+
+        start = self._slot(0)
+        end = start + self._count
+
+        if end <= self._size:
+            return [tuple(x[start:end] for x in views)]
+
+        return [
+            tuple(x[start:] for x in views),
+            tuple(x[: end - self._size] for x in views),
+        ]
+
+    def to_numpy(self):
+        """Return (times, coffee, steam) NumPy arrays, oldest first, only copying if the buffer has wrapped."""
+        import numpy as np
+
+        segments = self.segments()
+        if len(segments) == 1:
+            return segments[0]
+
+        return tuple(np.concatenate(x) for x in zip(*segments))
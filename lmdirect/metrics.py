@@ -0,0 +1,188 @@
+"""In-process counters and latency histograms."""
+from bisect import bisect_left
+
+"""Upper bounds of the latency buckets, in seconds."""
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+PREFIX = "lmdirect_"
+
+"""Metric names."""
+FRAMES_IN = "frames_in"
+FRAMES_OUT = "frames_out"
+ERRORS = "errors"
+CONNECTS = "connects"
+CONNECT_FAILURES = "connect_failures"
+POLLS_DROPPED = "polls_dropped"
+CONFLICTS = "conflicts"
+REQUEST_RTT = "request_rtt_seconds"
+DECRYPT_TIME = "decrypt_seconds"
+DECODE_TIME = "decode_seconds"
+CALLBACK_TIME = "callback_seconds"
+
+"""Labels for errors."""
+COMMAND_FAILED = "command_failed"
+UNEXPECTED_RESPONSE = "unexpected_response"
+MALFORMED_RESPONSE = "malformed_response"
+DECRYPT_FAILED = "decrypt_failed"
+
+HELP = {
+    FRAMES_IN: "Frames received from the machine",
+    FRAMES_OUT: "Frames sent to the machine",
+    ERRORS: "Frames that failed, by kind",
+    CONNECTS: "Connections made to the machine",
+    CONNECT_FAILURES: "Connection attempts that failed",
+    POLLS_DROPPED: "Reads dropped because another read answered them while they waited",
+    CONFLICTS: "Written values that were rolled back because the machine reported something else",
+    REQUEST_RTT: "Time from sending a request to receiving its response, by message",
+    DECRYPT_TIME: "Time spent decrypting a received frame",
+    DECODE_TIME: "Time spent decoding a received frame",
+    CALLBACK_TIME: "Time spent calling listeners",
+}
+
+
+class Histogram:
+    """Counts of observations in fixed buckets, plus their sum."""
+
+    __slots__ = ["buckets", "counts", "sum", "count"]
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        """The last count is for everything above the largest bucket."""
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        """Add an observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        total = 0
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+
+        return float("inf")
+
+    def snapshot(self):
+        """Return the histogram as a dict."""
+        return {
+            "buckets": dict(zip(self.buckets, self.counts)),
+            "overflow": self.counts[-1],
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+class Metrics:
+    """Counters and histograms keyed by (name, label)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, label=None, amount=1):
+        """Increment a counter."""
+        key = (name, label)
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, label=None):
+        """Add an observation to a histogram."""
+        key = (name, label)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self._buckets)
+        histogram.observe(value)
+
+    def counter(self, name, label=None):
+        """Return the value of a counter."""
+        return self._counters.get((name, label), 0)
+
+    def histogram(self, name, label=None):
+        """Return a histogram, or None if nothing has been observed."""
+        return self._histograms.get((name, label))
+
+    def reset(self):
+        """Drop everything."""
+        self._counters.clear()
+        self._histograms.clear()
+
+    def snapshot(self):
+        """Return the counters and histograms as a dict of plain values."""
+        result = {"counters": {}, "histograms": {}}
+
+        for (name, label), value in self._counters.items():
+            result["counters"].setdefault(name, {})[label] = value
+
+        for (name, label), histogram in self._histograms.items():
+            result["histograms"].setdefault(name, {})[label] = histogram.snapshot()
+
+        return result
+
+    def to_prometheus(self, label_name="msg", extra_labels=None):
+        """Render everything in the Prometheus text exposition format."""
+
+        def labels(label=None, **kwargs):
+            items = dict(extra_labels or {})
+            if label is not None:
+                items[label_name if name != ERRORS else "kind"] = label
+            items.update(kwargs)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}"
+
+        lines = []
+
+        for name in sorted({x[0] for x in self._counters}):
+            lines.append(f"# HELP {PREFIX}{name}_total {HELP.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}{name}_total counter")
+            for (key, label), value in self._counters.items():
+                if key == name:
+                    lines.append(f"{PREFIX}{name}_total{labels(label)} {value}")
+
+        for name in sorted({x[0] for x in self._histograms}):
+            lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (key, label), histogram in self._histograms.items():
+                if key != name:
+                    continue
+
+                total = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    total += count
+                    lines.append(
+                        f"{PREFIX}{name}_bucket{labels(label, le=bound)} {total}"
+                    )
+                lines.append(
+                    f"{PREFIX}{name}_bucket{labels(label, le='+Inf')} {histogram.count}"
+                )
+                lines.append(f"{PREFIX}{name}_sum{labels(label)} {histogram.sum}")
+                lines.append(f"{PREFIX}{name}_count{labels(label)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
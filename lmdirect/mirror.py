@@ -0,0 +1,180 @@
+"""Local copy of the machine's memory space."""
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+"""Size of each cached block in bytes."""
+BLOCK_SIZE = 0x10
+
+"""Blocks older than this (in seconds) are re-read from the machine."""
+DEFAULT_MAX_AGE = 5
+
+"""Largest region that we'll ask the machine for in a single read."""
+MAX_READ_LENGTH = 0x20
+
+
+def parse_region(msg):
+    """Split an "AAAALLLL" message into an (address, length) tuple."""
+    return int(msg[:4], 16), int(msg[4:8], 16)
+
+
+def format_region(address, length):
+    """Build an "AAAALLLL" message from an address and length."""
+    return "%04X%04X" % (address, length)
+
+
+class Block:
+    """A fixed-size chunk of machine memory."""
+
+    __slots__ = ("data", "valid", "timestamp", "dirty")
+
+    def __init__(self, size):
+        self.data = bytearray(size)
+        self.valid = bytearray(size)
+        self.timestamp = 0
+        self.dirty = False
+
+
+class MemoryMirror:
+    """Caches the machine's address space in fixed-size, timestamped blocks."""
+
+    def __init__(self, block_size=BLOCK_SIZE, max_age=DEFAULT_MAX_AGE):
+        self._block_size = block_size
+        self._max_age = max_age
+        self._blocks = {}
+
+    @property
+    def block_size(self):
+        """Return the block size in bytes."""
+        return self._block_size
+
+    @property
+    def max_age(self):
+        """Return the default maximum age of a block in seconds."""
+        return self._max_age
+
+    @max_age.setter
+    def max_age(self, value):
+        self._max_age = value
+
+    def _block_range(self, address, length):
+        """Return the block numbers that cover a region."""
+        return range(
+            address // self._block_size,
+            (address + length - 1) // self._block_size + 1,
+        )
+
+    def _spans(self, address, length):
+        """Yield (block number, start offset, end offset) for each block in a region."""
+        for number in self._block_range(address, length):
+            base = number * self._block_size
+            start = max(address, base) - base
+            end = min(address + length, base + self._block_size) - base
+            yield number, start, end
+
+    def update(self, address, data):
+        """Store ASCII-encoded hex data that was read from the machine."""
+        raw = bytes.fromhex(data)
+        now = time.monotonic()
+        offset = 0
+
+        for number, start, end in self._spans(address, len(raw)):
+            block = self._blocks.get(number)
+            if block is None:
+                block = self._blocks[number] = Block(self._block_size)
+
+            """Only treat the whole block as fresh if we didn't keep any older bytes."""
+            kept_older = any(
+                block.valid[i] for i in range(self._block_size) if not start <= i < end
+            )
+            if not kept_older:
+                block.timestamp = now
+                block.dirty = False
+
+            block.data[start:end] = raw[offset : offset + end - start]
+            block.valid[start:end] = b"\x01" * (end - start)
+            offset += end - start
+
+    def read(self, address, length):
+        """Return the cached region as ASCII-encoded hex, or None if any of it is missing."""
+        result = bytearray()
+
+        for number, start, end in self._spans(address, length):
+            block = self._blocks.get(number)
+            if block is None or not all(block.valid[start:end]):
+                return None
+            result += block.data[start:end]
+
+        return result.hex().upper()
+
+    def mark_dirty(self, address, length):
+        """Flag a region as changed on the machine so that it's re-read next time."""
+        for number in self._block_range(address, length):
+            block = self._blocks.get(number)
+            if block is not None:
+                block.dirty = True
+
+    def invalidate(self, address=None, length=None):
+        """Drop a region, or the whole mirror if no region is given."""
+        if address is None:
+            self._blocks = {}
+            return
+
+        for number in self._block_range(address, length):
+            self._blocks.pop(number, None)
+
+    def _is_stale(self, block, start, end, now, max_age):
+        """Check whether part of a block needs to be re-read."""
+        return (
+            block is None
+            or block.dirty
+            or not all(block.valid[start:end])
+            or now - block.timestamp > max_age
+        )
+
+    def is_fresh(self, address, length, max_age=None):
+        """Check whether a region can be served without going to the machine."""
+        return not self.stale_ranges(address, length, max_age)
+
+    def stale_ranges(self, address, length, max_age=None, max_length=MAX_READ_LENGTH):
+        """Return the (address, length) ranges of a region that need to be re-read."""
+        if max_age is None:
+            max_age = self._max_age
+
+        now = time.monotonic()
+        ranges = []
+
+        for number, start, end in self._spans(address, length):
+            if not self._is_stale(self._blocks.get(number), start, end, now, max_age):
+                continue
+
+            range_start = number * self._block_size + start
+            range_length = end - start
+
+            """Coalesce with the previous range if they're contiguous."""
+            if ranges:
+                prev_start, prev_length = ranges[-1]
+                if (
+                    prev_start + prev_length == range_start
+                    and prev_length + range_length <= max_length
+                ):
+                    ranges[-1] = (prev_start, prev_length + range_length)
+                    continue
+
+            ranges.append((range_start, range_length))
+
+        return ranges
+
+    def age(self, address, length):
+        """Return the age in seconds of the oldest block in a region, or None if it's missing."""
+        now = time.monotonic()
+        oldest = None
+
+        for number, start, end in self._spans(address, length):
+            block = self._blocks.get(number)
+            if block is None or not all(block.valid[start:end]):
+                return None
+            oldest = max(oldest or 0, now - block.timestamp)
+
+        return oldest
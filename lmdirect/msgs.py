@@ -609,6 +609,16 @@ class Msg:
         """Return map if we should decode, None if not"""
         return self._map
 
+    @property
+    def address(self):
+        """Memory address of the region"""
+        return int(self._msg[:4], 16)
+
+    @property
+    def length(self):
+        """Length of the region in bytes"""
+        return int(self._msg[4:8], 16)
+
 
 MSGS = {
     # Reads
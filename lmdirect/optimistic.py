@@ -0,0 +1,67 @@
+"""Values that have been written to the machine but not yet confirmed by reading them back."""
+import time
+from collections import namedtuple
+
+"""Seconds the machine gets to report a written value before it's rolled back."""
+DEFAULT_TTL = 10
+
+Pending = namedtuple("Pending", ["value", "deadline"])
+
+"""The machine disagreed with a written value: what was written and what it reported instead."""
+Conflict = namedtuple("Conflict", ["expected", "reported"])
+
+
+class OptimisticValues:
+    """Written values that are shown instead of what the machine reports, until it agrees or time runs out."""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._pending = {}
+
+    def __contains__(self, key):
+        return key in self._pending
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, updates):
+        """Start waiting for the machine to report the written values."""
+        deadline = time.monotonic() + self.ttl
+        for key, value in updates.items():
+            self._pending[key] = Pending(value, deadline)
+
+    def expire(self, keys):
+        """Stop waiting, e.g. because the machine rejected the write, so the next report decides."""
+        for key in keys:
+            pending = self._pending.get(key)
+            if pending is not None:
+                self._pending[key] = pending._replace(deadline=0)
+
+    def deadline(self, keys):
+        """Return the latest deadline of the keys that are still waiting, or None."""
+        deadlines = [self._pending[x].deadline for x in keys if x in self._pending]
+        return max(deadlines) if deadlines else None
+
+    def prune(self):
+        """Forget values whose deadline passed without the machine reporting anything for them."""
+        now = time.monotonic()
+        for key in [k for k, v in self._pending.items() if v.deadline <= now]:
+            del self._pending[key]
+
+    def reconcile(self, key, reported):
+        """Return the value to store for a reported value, and a Conflict if the written one was rolled back."""
+        pending = self._pending.get(key)
+        if pending is None:
+            return reported, None
+
+        if reported == pending.value:
+            """Confirmed."""
+            del self._pending[key]
+            return reported, None
+
+        if time.monotonic() < pending.deadline:
+            """The machine may not have caught up yet."""
+            return pending.value, None
+
+        del self._pending[key]
+        return reported, Conflict(pending.value, reported)
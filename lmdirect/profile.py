@@ -0,0 +1,175 @@
+"""Settings that can be applied from a profile of desired values."""
+from collections import namedtuple
+
+from .const import ENABLED
+from .decoder import get_key
+from .msgs import (
+    AUTO,
+    DAYS,
+    DOSE,
+    DOSE_HOT_WATER,
+    ENABLE_PREBREWING,
+    ENABLE_PREINFUSION,
+    GLOBAL,
+    HOUR,
+    MIN,
+    OFF,
+    ON,
+    POWER,
+    PREBREWING,
+    PREINFUSION,
+    STEAM_BOILER_ENABLE,
+    TOFF,
+    TON,
+    TSET_COFFEE,
+    TSET_STEAM,
+    Msg,
+)
+
+"""Result of applying a profile: {key: (old, new)} for every key that was written, and the WriteResults."""
+ProfileResult = namedtuple("ProfileResult", ["changed", "results"])
+
+
+def is_enabled(value):
+    """Accept either a bool or the ENABLED/DISABLED strings used in the status dict."""
+    return value == ENABLED if isinstance(value, str) else bool(value)
+
+
+class Setting:
+    """A group of status keys that are written together by one service."""
+
+    def __init__(self, msg_ids, keys, build):
+        """build(lmdirect, values, status) returns the Change for a dict of desired values."""
+        self._msg_ids = msg_ids
+        self._keys = [get_key(x) for x in keys]
+        self._build = build
+
+    @property
+    def msg_ids(self):
+        """Reads that cover the current values of this setting."""
+        return self._msg_ids
+
+    @property
+    def keys(self):
+        """Status keys that make up this setting."""
+        return self._keys
+
+    def build(self, lmdirect, values, status):
+        """Return the Change that writes the desired values."""
+        return self._build(lmdirect, values, status)
+
+
+def _build_brew_mode(lmdirect, values, status):
+    """Prebrewing and preinfusion share a register, so decide between them together."""
+    prebrewing = is_enabled(values[ENABLE_PREBREWING])
+    preinfusion = is_enabled(values[ENABLE_PREINFUSION])
+
+    if prebrewing and preinfusion:
+        raise ValueError("Prebrewing and preinfusion can't both be enabled")
+    if preinfusion:
+        return lmdirect._build_preinfusion_enable(True)
+    return lmdirect._build_prebrewing_enable(prebrewing)
+
+
+def _settings():
+    """Build the table of settings from the message maps."""
+    settings = [
+        Setting(
+            [Msg.GET_CONFIG],
+            [POWER],
+            lambda lm, v, s: lm._build_power(v[POWER]),
+        ),
+        Setting(
+            [Msg.GET_CONFIG],
+            [TSET_COFFEE],
+            lambda lm, v, s: lm._build_coffee_temp(v[TSET_COFFEE]),
+        ),
+        Setting(
+            [Msg.GET_CONFIG],
+            [TSET_STEAM],
+            lambda lm, v, s: lm._build_steam_temp(v[TSET_STEAM]),
+        ),
+        Setting(
+            [Msg.GET_CONFIG],
+            [DOSE_HOT_WATER],
+            lambda lm, v, s: lm._build_dose_hot_water(v[DOSE_HOT_WATER]),
+        ),
+        Setting(
+            [Msg.GET_CONFIG, Msg.GET_PREINFUSION_TIMES],
+            [ENABLE_PREBREWING, ENABLE_PREINFUSION],
+            _build_brew_mode,
+        ),
+        Setting(
+            [Msg.GET_STATUS],
+            [STEAM_BOILER_ENABLE],
+            lambda lm, v, s: lm._build_steam_boiler_enable(
+                is_enabled(v[STEAM_BOILER_ENABLE])
+            ),
+        ),
+    ]
+
+    for key in range(1, 6):
+        dose = get_key((DOSE, f"k{key}"))
+        settings.append(
+            Setting(
+                [Msg.GET_CONFIG],
+                [dose],
+                lambda lm, v, s, key=key, dose=dose: lm._build_dose(key, v[dose]),
+            )
+        )
+
+    for key in range(1, 5):
+        ton = get_key((PREBREWING, TON, f"k{key}"))
+        toff = get_key((PREBREWING, TOFF, f"k{key}"))
+        settings.append(
+            Setting(
+                [Msg.GET_CONFIG],
+                [ton, toff],
+                lambda lm, v, s, key=key, ton=ton, toff=toff: lm._build_prebrew_times(
+                    key, v[ton], v[toff]
+                ),
+            )
+        )
+
+        preinfusion = get_key((PREINFUSION, f"k{key}"))
+        settings.append(
+            Setting(
+                [Msg.GET_PREINFUSION_TIMES],
+                [preinfusion],
+                lambda lm, v, s, key=key, p=preinfusion: lm._build_preinfusion_time(
+                    key, v[p]
+                ),
+            )
+        )
+
+    for day in [GLOBAL] + DAYS:
+        auto = get_key((day, AUTO))
+        settings.append(
+            Setting(
+                [Msg.GET_AUTO_ON_OFF_TIMES],
+                [auto],
+                lambda lm, v, s, day=day, auto=auto: lm._build_auto_on_off_enable(
+                    day, is_enabled(v[auto]), status=s
+                ),
+            )
+        )
+
+    for day in DAYS:
+        keys = [get_key((day, x, y)) for x in [ON, OFF] for y in [HOUR, MIN]]
+        settings.append(
+            Setting(
+                [Msg.GET_AUTO_ON_OFF_TIMES],
+                keys,
+                lambda lm, v, s, day=day, keys=keys: lm._build_auto_on_off_times(
+                    day, v[keys[0]], v[keys[1]], v[keys[2]], v[keys[3]]
+                ),
+            )
+        )
+
+    return settings
+
+
+SETTINGS = _settings()
+
+"""Look up the setting that owns a status key."""
+SETTINGS_BY_KEY = {key: x for x in SETTINGS for key in x.keys}
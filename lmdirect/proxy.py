@@ -0,0 +1,268 @@
+"""Shares one connection to a machine between many local clients."""
+import asyncio
+import logging
+import sys
+
+from .aescipher import AESCipher
+from .connection import DEFAULT_RESPONSE_TIMEOUT, checksum
+from .mirror import parse_region
+from .msgs import MSGS, Msg
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 1774
+
+"""Unsolicited frames that are passed on to every client."""
+BROADCAST_MSGS = [Msg.GET_WATER_FLOW, Msg.GET_TEMP_REPORT]
+
+
+class _Client:
+    """A downstream client, speaking either the encrypted protocol or plain text lines."""
+
+    def __init__(self, writer, cipher=None):
+        self._writer = writer
+        self._cipher = cipher
+
+    def send(self, plaintext):
+        if self._writer.is_closing():
+            return
+
+        if self._cipher is not None:
+            self._writer.write(
+                b"@" + self._cipher.encrypt(plaintext + checksum(plaintext)) + b"%"
+            )
+        else:
+            self._writer.write(plaintext.encode("latin-1") + b"\n")
+
+
+class Proxy:
+    """Holds the only connection to a machine and serves many clients over it."""
+
+    def __init__(
+        self,
+        lmdirect,
+        host="0.0.0.0",
+        port=DEFAULT_PORT,
+        plain_port=None,
+        key=None,
+        timeout=DEFAULT_RESPONSE_TIMEOUT,
+    ):
+        """Clients on port use the machine's encrypted protocol, clients on plain_port send one plaintext frame per line.
+
+        Reads are answered from the mirror when it's fresh, and identical reads share one
+        request to the machine. Writes are sent one at a time.
+        """
+        self._lmdirect = lmdirect
+        self._host = host
+        self._port = port
+        self._plain_port = plain_port
+        self._key = key
+        self._timeout = timeout
+
+        self._servers = []
+        self._clients = set()
+        self._handlers = set()
+        self._write_lock = asyncio.Lock()
+        self._raw_callbacks = []
+
+    @property
+    def clients(self):
+        """Return the number of connected clients."""
+        return len(self._clients)
+
+    @property
+    def port(self):
+        """Return the port for encrypted clients."""
+        return self._port
+
+    @property
+    def plain_port(self):
+        """Return the port for plain text clients."""
+        return self._plain_port
+
+    async def start(self):
+        """Start listening for clients."""
+        server = await asyncio.start_server(
+            self._handle_encrypted, self._host, self._port
+        )
+        self._port = server.sockets[0].getsockname()[1]
+        self._servers.append(server)
+
+        if self._plain_port is not None:
+            server = await asyncio.start_server(
+                self._handle_plain, self._host, self._plain_port
+            )
+            self._plain_port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+
+        for msg_id in BROADCAST_MSGS:
+            key = (msg_id, self._broadcast)
+            self._lmdirect.register_raw_callback(*key)
+            self._raw_callbacks.append(key)
+
+        return self
+
+    async def close(self):
+        """Stop listening and disconnect every client."""
+        for key in self._raw_callbacks:
+            self._lmdirect.deregister_raw_callback(key)
+        self._raw_callbacks = []
+
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+        handlers = list(self._handlers)
+        for client in list(self._clients):
+            client._writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _broadcast(self, key, data):
+        """Raw callback: pass unsolicited frames on to every client."""
+        cur_msg = MSGS[key[0]]
+        if self._lmdirect.is_response(cur_msg.msg_type, cur_msg.msg):
+            """Whoever asked for it gets the answer, nobody else."""
+            return
+
+        plaintext = cur_msg.msg_type + cur_msg.msg + data
+        for client in list(self._clients):
+            client.send(plaintext)
+
+    async def _read(self, msg):
+        """Return the response to a read, or None if the machine didn't answer."""
+        data = await self._lmdirect.forward_read(msg, self._timeout)
+        if data is None:
+            return None
+
+        return Msg.READ + msg + data
+
+    async def _write(self, msg, data):
+        """Send a write and return the response, or None if the machine didn't answer."""
+        async with self._write_lock:
+            ok = await self._lmdirect.forward_write(msg, data, self._timeout)
+
+        if ok is None:
+            return None
+
+        return Msg.WRITE + msg + (Msg.RESPONSE_GOOD if ok else "")
+
+    async def _respond(self, client, plaintext):
+        """Answer a frame from a client."""
+        msg_type = plaintext[:1]
+        msg = plaintext[1:9]
+
+        try:
+            parse_region(msg)
+        except ValueError:
+            _LOGGER.debug(f"Ignoring malformed frame: {plaintext}")
+            return
+
+        try:
+            if msg_type == Msg.READ:
+                response = await self._read(msg)
+            elif msg_type == Msg.WRITE:
+                response = await self._write(msg, plaintext[9:])
+            else:
+                _LOGGER.debug(f"Ignoring frame: {plaintext}")
+                return
+        except Exception as err:
+            _LOGGER.error(f"Failed to forward {plaintext}: {err}")
+            return
+
+        if response is not None:
+            client.send(response)
+
+    async def _serve(self, client, frames):
+        """Answer frames from a client until it disconnects."""
+        self._clients.add(client)
+        self._handlers.add(asyncio.current_task())
+        tasks = set()
+
+        try:
+            async for plaintext in frames:
+                """Answer in the background so that one slow read doesn't hold up the rest."""
+                task = asyncio.get_event_loop().create_task(
+                    self._respond(client, plaintext)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._clients.discard(client)
+            self._handlers.discard(asyncio.current_task())
+            client._writer.close()
+
+    async def _handle_encrypted(self, reader, writer):
+        key = self._key or self._lmdirect.key
+        if not key:
+            _LOGGER.error("Dropping client, the machine's key isn't known yet")
+            writer.close()
+            return
+
+        cipher = AESCipher(key)
+
+        async def frames():
+            while True:
+                try:
+                    encoded_data = await reader.readuntil(separator=b"%")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+
+                try:
+                    plaintext = cipher.decrypt(encoded_data[1:-1])
+                except ValueError:
+                    _LOGGER.debug(f"Undecodable frame: {encoded_data}")
+                    continue
+
+                if checksum(plaintext[:-2]) != plaintext[-2:]:
+                    _LOGGER.debug(f"Bad check byte: {plaintext}")
+                    continue
+
+                yield plaintext[:-2]
+
+        await self._serve(_Client(writer, cipher), frames())
+
+    async def _handle_plain(self, reader, writer):
+        async def frames():
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+
+                plaintext = line.decode("latin-1").strip()
+                if plaintext:
+                    yield plaintext
+
+        await self._serve(_Client(writer), frames())
+
+
+async def _main(port, plain_port):
+    import json
+
+    from . import LMDirect
+
+    with open("config.json") as config_file:
+        machine_info = json.load(config_file)
+
+    lmdirect = LMDirect(machine_info)
+    async with Proxy(lmdirect, port=port, plain_port=plain_port) as proxy:
+        print(f"Proxying on port {proxy.port}, plain text on port {proxy.plain_port}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m lmdirect.proxy <port> [plain port]")
+        sys.exit(1)
+
+    asyncio.run(
+        _main(int(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    )
@@ -0,0 +1,166 @@
+"""Columnar time-series recording of decoded machine state."""
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+
+_LOGGER = logging.getLogger(__name__)
+
+"""Samples buffered per key before they're written to disk."""
+DEFAULT_FLUSH_SIZE = 256
+
+"""Each key has a timestamp column and a value column of float64s."""
+TIMES_SUFFIX = ".t"
+VALUES_SUFFIX = ".v"
+ITEM_SIZE = 8
+
+
+def _is_numeric(value):
+    """Only numbers and flags are recorded."""
+    return isinstance(value, (int, float))
+
+
+def _filename(directory, key, suffix):
+    """Return the path of a column file."""
+    return os.path.join(directory, key.replace(os.sep, "_") + suffix)
+
+
+def _append_mapped(path, buffer):
+    """Append an array to a file through a memory map."""
+    data = memoryview(buffer).cast("B")
+    if not len(data):
+        return
+
+    if not os.path.exists(path):
+        open(path, "wb").close()
+
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.truncate(size + len(data))
+        with mmap.mmap(f.fileno(), size + len(data)) as mapped:
+            mapped[size:] = data
+
+
+class ColumnRecorder:
+    """Appends every changed numeric field to per-key timestamp and value columns."""
+
+    def __init__(self, directory, flush_size=DEFAULT_FLUSH_SIZE):
+        self._directory = directory
+        self._flush_size = flush_size
+        self._buffers = {}
+        self._lmdirect = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        """Return the directory that the columns are written to."""
+        return self._directory
+
+    def attach(self, lmdirect):
+        """Start recording changes from an LMDirect instance."""
+        self._lmdirect = lmdirect
+        lmdirect.register_change_callback(self.record)
+        return self
+
+    def detach(self):
+        """Stop recording and write out anything buffered."""
+        if self._lmdirect is not None:
+            self._lmdirect.deregister_change_callback(self.record)
+            self._lmdirect = None
+        self.flush()
+
+    def record(self, changes, timestamp=None):
+        """Change callback: buffer the numeric values."""
+        if timestamp is None:
+            timestamp = time.time()
+
+        for key, value in changes.items():
+            if not _is_numeric(value):
+                continue
+
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = (array("d"), array("d"))
+
+            times, values = buffer
+            times.append(timestamp)
+            values.append(value)
+
+            if len(times) >= self._flush_size:
+                self._flush_key(key)
+
+    def _flush_key(self, key):
+        """Write the buffered samples for a key to its columns."""
+        times, values = self._buffers[key]
+        _append_mapped(_filename(self._directory, key, TIMES_SUFFIX), times)
+        _append_mapped(_filename(self._directory, key, VALUES_SUFFIX), values)
+        self._buffers[key] = (array("d"), array("d"))
+
+    def flush(self):
+        """Write all buffered samples to disk."""
+        for key in list(self._buffers):
+            self._flush_key(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.detach()
+
+
+class ColumnReader:
+    """Loads time ranges of recorded columns without parsing anything else."""
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def keys(self):
+        """Return the keys that have been recorded."""
+        return sorted(
+            x[: -len(TIMES_SUFFIX)]
+            for x in os.listdir(self._directory)
+            if x.endswith(TIMES_SUFFIX)
+        )
+
+    def _bisect(self, mapped, count, timestamp):
+        """Return the index of the first sample at or after a timestamp."""
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if struct.unpack_from("d", mapped, mid * ITEM_SIZE)[0] < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def load(self, key, start=None, end=None, numpy=False):
+        """Return (times, values) for samples with start <= timestamp < end."""
+        times_path = _filename(self._directory, key, TIMES_SUFFIX)
+        values_path = _filename(self._directory, key, VALUES_SUFFIX)
+
+        if not os.path.exists(times_path) or not os.path.getsize(times_path):
+            return (array("d"), array("d"))
+
+        with open(times_path, "rb") as tf, open(values_path, "rb") as vf:
+            with mmap.mmap(tf.fileno(), 0, access=mmap.ACCESS_READ) as tm, mmap.mmap(
+                vf.fileno(), 0, access=mmap.ACCESS_READ
+            ) as vm:
+                count = min(len(tm), len(vm)) // ITEM_SIZE
+                first = 0 if start is None else self._bisect(tm, count, start)
+                last = count if end is None else self._bisect(tm, count, end)
+
+                result = []
+                for mapped in [tm, vm]:
+                    column = array("d")
+                    column.frombytes(mapped[first * ITEM_SIZE : last * ITEM_SIZE])
+                    result.append(column)
+
+        if numpy:
+            import numpy as np
+
+            return tuple(np.frombuffer(x, dtype=np.float64) for x in result)
+
+        return tuple(result)
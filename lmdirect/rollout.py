@@ -0,0 +1,179 @@
+"""Apply a settings change across a fleet of machines."""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+from .connection import ConnectionFail
+
+_LOGGER = logging.getLogger(__name__)
+
+"""Maximum number of machines that are changed at the same time."""
+DEFAULT_CONCURRENCY = 32
+
+"""Number of additional attempts after a transient failure."""
+DEFAULT_RETRIES = 2
+
+"""Delay before the first retry, doubled for each one after that."""
+DEFAULT_RETRY_DELAY = 1
+
+"""Maximum time for a single attempt on a single machine."""
+DEFAULT_TIMEOUT = 15
+
+"""Failures that are worth retrying. Anything else (e.g. invalid input) fails immediately."""
+RETRY_EXCEPTIONS = (ConnectionFail, asyncio.TimeoutError, OSError)
+
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+"""Outcome for a single machine."""
+MachineResult = namedtuple(
+    "MachineResult", ["name", "status", "attempts", "result", "error", "elapsed"]
+)
+
+
+def machine_name(lmdirect):
+    """Return a name to identify a machine in reports: its serial number, or its name if that isn't known."""
+    for name in ["serial_number", "machine_name"]:
+        try:
+            return getattr(lmdirect, name)
+        except KeyError:
+            continue
+    return None
+
+
+class RolloutReport:
+    """Structured result of a rollout."""
+
+    def __init__(self, results, canaries, aborted, elapsed):
+        self._results = results
+        self._canaries = canaries
+        self._aborted = aborted
+        self._elapsed = elapsed
+
+    @property
+    def results(self):
+        """Return a MachineResult for every machine, in the order they were given."""
+        return self._results
+
+    @property
+    def succeeded(self):
+        return [x for x in self._results if x.status == OK]
+
+    @property
+    def failed(self):
+        return [x for x in self._results if x.status == FAILED]
+
+    @property
+    def skipped(self):
+        return [x for x in self._results if x.status == SKIPPED]
+
+    @property
+    def aborted(self):
+        """Return True if the rollout stopped after the canaries failed."""
+        return self._aborted
+
+    @property
+    def elapsed(self):
+        """Return the total time taken in seconds."""
+        return self._elapsed
+
+    def summary(self):
+        """Return a dict suitable for logging or serializing."""
+        return {
+            "machines": len(self._results),
+            "canaries": self._canaries,
+            OK: len(self.succeeded),
+            FAILED: len(self.failed),
+            SKIPPED: len(self.skipped),
+            "aborted": self._aborted,
+            "elapsed": round(self._elapsed, 3),
+            "failures": {x.name: repr(x.error) for x in self.failed},
+        }
+
+
+class Rollout:
+    """Applies a change to many LMDirect instances with a concurrency cap, retries and canaries."""
+
+    def __init__(
+        self,
+        machines,
+        change,
+        concurrency=DEFAULT_CONCURRENCY,
+        retries=DEFAULT_RETRIES,
+        retry_delay=DEFAULT_RETRY_DELAY,
+        timeout=DEFAULT_TIMEOUT,
+        canaries=1,
+    ):
+        """change is an async callable that takes an LMDirect instance, e.g. lambda x: x.set_coffee_temp(93)."""
+        self._machines = list(machines)
+        self._change = change
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._timeout = timeout
+        self._canaries = min(canaries, len(self._machines))
+
+    async def _apply(self, lmdirect):
+        """Apply the change to a single machine, retrying transient failures."""
+        name = machine_name(lmdirect)
+        start = time.monotonic()
+        error = None
+
+        for attempt in range(1, self._retries + 2):
+            if attempt > 1:
+                await asyncio.sleep(self._retry_delay * 2 ** (attempt - 2))
+
+            async with self._semaphore:
+                try:
+                    result = await asyncio.wait_for(
+                        self._change(lmdirect), timeout=self._timeout
+                    )
+                except RETRY_EXCEPTIONS as err:
+                    _LOGGER.debug(f"Rollout to {name} failed on attempt {attempt}: {err}")
+                    error = err
+                    continue
+                except Exception as err:
+                    _LOGGER.debug(f"Rollout to {name} failed: {err}")
+                    return MachineResult(
+                        name, FAILED, attempt, None, err, time.monotonic() - start
+                    )
+
+            return MachineResult(
+                name, OK, attempt, result, None, time.monotonic() - start
+            )
+
+        return MachineResult(
+            name, FAILED, self._retries + 1, None, error, time.monotonic() - start
+        )
+
+    async def _stage(self, machines):
+        """Apply the change to a group of machines concurrently."""
+        return await asyncio.gather(*[self._apply(x) for x in machines])
+
+    async def run(self):
+        """Run the rollout, canaries first, and return a RolloutReport."""
+        start = time.monotonic()
+        canaries = self._machines[: self._canaries]
+        rest = self._machines[self._canaries :]
+
+        results = await self._stage(canaries)
+        aborted = any(x.status != OK for x in results)
+
+        if aborted:
+            _LOGGER.warning(f"Canary failed, skipping {len(rest)} machines")
+            results += [
+                MachineResult(machine_name(x), SKIPPED, 0, None, None, 0) for x in rest
+            ]
+        else:
+            results += await self._stage(rest)
+
+        report = RolloutReport(results, len(canaries), aborted, time.monotonic() - start)
+        _LOGGER.debug(f"Rollout finished: {report.summary()}")
+        return report
+
+
+async def rollout(machines, change, **kwargs):
+    """Apply a change to many machines and return a RolloutReport."""
+    return await Rollout(machines, change, **kwargs).run()
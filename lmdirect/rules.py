@@ -0,0 +1,275 @@
+"""Alert rules that are re-evaluated only when the keys they read change."""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+_LOGGER = logging.getLogger(__name__)
+
+"""An alert being raised (active) or cleared for a rule on a machine."""
+Alert = namedtuple("Alert", ["machine", "rule", "active", "values", "timestamp"])
+
+
+class Rule:
+    """A condition on some keys that raises an alert while it holds.
+
+    condition(values, previous) gets the current and previously evaluated values of the keys.
+    The alert clears when clear(values, previous) holds, or when the condition stops holding
+    if no clear is given, which allows for hysteresis. The condition has to hold for debounce
+    seconds before the alert is raised, and clear has to hold for clear_debounce seconds
+    before it's cleared.
+    """
+
+    """Whether every change to the keys restarts the debounce and clears the alert."""
+    restart_on_change = False
+
+    def __init__(
+        self, name, keys, condition, clear=None, debounce=0, clear_debounce=0
+    ):
+        self.name = name
+        self.keys = tuple(keys)
+        self._condition = condition
+        self._clear = clear
+        self.debounce = debounce
+        self.clear_debounce = clear_debounce
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r}, {self.keys})"
+
+    def fires(self, values, previous):
+        """Check whether the alert should be raised."""
+        return bool(self._condition(values, previous))
+
+    def clears(self, values, previous):
+        """Check whether a raised alert should be cleared."""
+        if self._clear is None:
+            return not self.fires(values, previous)
+        return bool(self._clear(values, previous))
+
+
+class Threshold(Rule):
+    """Alerts while a value is outside [low, high], and clears once it's back inside by hysteresis."""
+
+    def __init__(self, name, key, low=None, high=None, hysteresis=0, **kwargs):
+        def outside(values, previous, margin=0):
+            value = values[key]
+            if value is None:
+                return False
+            return (low is not None and value < low + margin) or (
+                high is not None and value > high - margin
+            )
+
+        super().__init__(
+            name,
+            [key],
+            outside,
+            lambda values, previous: not outside(values, previous, hysteresis),
+            **kwargs,
+        )
+
+
+class Equals(Rule):
+    """Alerts while a value equals the given one, e.g. a lost water reservoir contact."""
+
+    def __init__(self, name, key, value, **kwargs):
+        super().__init__(
+            name, [key], lambda values, previous: values[key] == value, **kwargs
+        )
+
+
+class Stuck(Rule):
+    """Alerts when a value hasn't changed for duration seconds, optionally only for some values."""
+
+    restart_on_change = True
+
+    def __init__(self, name, key, duration, values=None, **kwargs):
+        def stuck(current, previous):
+            return current[key] is not None and (
+                values is None or current[key] in values
+            )
+
+        super().__init__(name, [key], stuck, debounce=duration, **kwargs)
+
+
+class Jump(Rule):
+    """Alerts when a counter increases by more than max_delta in one update."""
+
+    def __init__(self, name, key, max_delta, **kwargs):
+        def jumped(values, previous):
+            if values[key] is None or previous is None or previous[key] is None:
+                return False
+            return values[key] - previous[key] > max_delta
+
+        super().__init__(name, [key], jumped, **kwargs)
+
+
+class _RuleState:
+    """What a rule last saw on one machine."""
+
+    __slots__ = ["active", "previous", "pending"]
+
+    def __init__(self):
+        self.active = False
+        self.previous = None
+        self.pending = None
+
+
+class RuleEngine:
+    """Evaluates rules against the change events of many machines.
+
+    Rules are indexed by the keys they read, so each change only re-evaluates the rules
+    that read a changed key, and the cost scales with the rate of change rather than the
+    number of machines and rules.
+    """
+
+    def __init__(self, rules=()):
+        self._rules = {}
+        self._by_key = {}
+        self._machines = {}
+        self._states = {}
+        self._alert_callback_list = []
+
+        """How many times a rule has been evaluated."""
+        self.evaluations = 0
+
+        for rule in rules:
+            self.add_rule(rule)
+
+    @property
+    def active(self):
+        """Return the raised alerts as {(machine, rule name): values}."""
+        return {
+            key: state.previous for key, state in self._states.items() if state.active
+        }
+
+    def add_rule(self, rule):
+        """Add a rule and evaluate it for every watched machine."""
+        if rule.name in self._rules:
+            raise ValueError(f"Rule {rule.name} already exists")
+
+        self._rules[rule.name] = rule
+        for key in rule.keys:
+            self._by_key.setdefault(key, []).append(rule)
+
+        for machine, (lmdirect, _) in self._machines.items():
+            self._evaluate(machine, rule, lmdirect.current_status)
+
+    def remove_rule(self, name):
+        """Remove a rule, dropping its alerts without reporting them as cleared."""
+        rule = self._rules.pop(name)
+        for key in rule.keys:
+            self._by_key[key].remove(rule)
+            if not self._by_key[key]:
+                del self._by_key[key]
+
+        for key in [x for x in self._states if x[1] == name]:
+            self._cancel(self._states.pop(key))
+
+    def register_alert_callback(self, callback):
+        """Register callback for alerts being raised and cleared."""
+        if callable(callback):
+            self._alert_callback_list.append(callback)
+
+    def deregister_alert_callback(self, callback):
+        """Deregister an alert callback."""
+        if callback in self._alert_callback_list:
+            self._alert_callback_list.remove(callback)
+
+    def watch(self, machine, lmdirect):
+        """Evaluate the rules against a machine now, and again whenever the keys they read change."""
+        if machine in self._machines:
+            raise ValueError(f"Already watching {machine}")
+
+        def on_change(changes):
+            self.on_change(machine, lmdirect.current_status, changes)
+
+        self._machines[machine] = (lmdirect, on_change)
+        lmdirect.register_change_callback(on_change)
+
+        status = lmdirect.current_status
+        for rule in self._rules.values():
+            self._evaluate(machine, rule, status)
+
+    def unwatch(self, machine):
+        """Stop watching a machine and drop its alerts."""
+        lmdirect, on_change = self._machines.pop(machine)
+        lmdirect.deregister_change_callback(on_change)
+
+        for key in [x for x in self._states if x[0] == machine]:
+            self._cancel(self._states.pop(key))
+
+    def close(self):
+        """Stop watching every machine."""
+        for machine in list(self._machines):
+            self.unwatch(machine)
+
+    def on_change(self, machine, status, changes):
+        """Re-evaluate only the rules that read a changed key."""
+        rules = {}
+        for key in changes:
+            for rule in self._by_key.get(key, ()):
+                rules[rule.name] = rule
+
+        for rule in rules.values():
+            self._evaluate(machine, rule, status)
+
+    def _evaluate(self, machine, rule, status):
+        self.evaluations += 1
+        state = self._states.get((machine, rule.name))
+        if state is None:
+            state = self._states[(machine, rule.name)] = _RuleState()
+
+        values = {x: status.get(x) for x in rule.keys}
+        previous, state.previous = state.previous, values
+
+        if rule.restart_on_change:
+            """Any change means the value isn't stuck, so start over."""
+            self._cancel(state)
+            if state.active:
+                self._transition(machine, rule, state, False)
+            if rule.fires(values, previous):
+                self._schedule(machine, rule, state, True, rule.debounce)
+            return
+
+        if state.active:
+            wanted = not rule.clears(values, previous)
+        else:
+            wanted = rule.fires(values, previous)
+
+        if wanted == state.active:
+            """Anything pending didn't hold for long enough."""
+            self._cancel(state)
+            return
+
+        delay = rule.debounce if wanted else rule.clear_debounce
+        if delay <= 0:
+            self._transition(machine, rule, state, wanted)
+        elif state.pending is None:
+            self._schedule(machine, rule, state, wanted, delay)
+
+    def _schedule(self, machine, rule, state, active, delay):
+        state.pending = asyncio.get_event_loop().call_later(
+            delay, self._debounced, machine, rule, state, active
+        )
+
+    def _debounced(self, machine, rule, state, active):
+        """The condition held for the whole debounce period."""
+        state.pending = None
+        if self._states.get((machine, rule.name)) is state:
+            self._transition(machine, rule, state, active)
+
+    def _cancel(self, state):
+        if state.pending is not None:
+            state.pending.cancel()
+            state.pending = None
+
+    def _transition(self, machine, rule, state, active):
+        state.active = active
+        alert = Alert(machine, rule.name, active, state.previous, time.time())
+        _LOGGER.debug(f"{'Raised' if active else 'Cleared'} {rule.name} on {machine}")
+
+        for callback in self._alert_callback_list:
+            try:
+                callback(alert)
+            except Exception as err:
+                _LOGGER.error(f"Alert callback failed for {rule.name}: {err}")
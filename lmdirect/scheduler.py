@@ -0,0 +1,84 @@
+"""Decides whose turn it is to send to the machine."""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+"""Priorities, most urgent first."""
+PRIORITY_WRITE = 0
+PRIORITY_POLL = 1
+
+"""A poll that has waited this long (in seconds) goes before any writes that are waiting."""
+MAX_POLL_DELAY = 1
+
+
+class SendScheduler:
+    """Gives one sender at a time its turn, writes ahead of polls and oldest first otherwise.
+
+    Polls that have waited longer than max_poll_delay go first so that a stream of writes
+    can't starve them.
+    """
+
+    def __init__(self, max_poll_delay=MAX_POLL_DELAY):
+        self._max_poll_delay = max_poll_delay
+        self._busy = False
+        self._waiting = {PRIORITY_WRITE: deque(), PRIORITY_POLL: deque()}
+
+    @property
+    def waiting(self):
+        """Return the number of senders waiting for a turn, by priority."""
+        return {k: len(v) for k, v in self._waiting.items()}
+
+    @asynccontextmanager
+    async def turn(self, priority):
+        """Wait for a turn to send, and hold it until the block exits."""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority):
+        if not self._busy and not any(self._waiting.values()):
+            self._busy = True
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        entry = (time.monotonic(), future)
+        self._waiting[priority].append(entry)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                """We were given the turn just as we were cancelled, so pass it on."""
+                self._release()
+            elif entry in self._waiting[priority]:
+                self._waiting[priority].remove(entry)
+            raise
+
+    def _release(self):
+        future = self._next()
+        if future is None:
+            self._busy = False
+        else:
+            future.set_result(None)
+
+    def _next(self):
+        """Return the future of the next sender, or None if nobody's waiting."""
+        for queue in self._waiting.values():
+            while queue and queue[0][1].done():
+                queue.popleft()
+
+        writes = self._waiting[PRIORITY_WRITE]
+        polls = self._waiting[PRIORITY_POLL]
+
+        if polls and (
+            not writes or time.monotonic() - polls[0][0] > self._max_poll_delay
+        ):
+            return polls.popleft()[1]
+
+        if writes:
+            return writes.popleft()[1]
+
+        return None
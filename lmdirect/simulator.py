@@ -0,0 +1,324 @@
+"""Local simulation of network-connected espresso machines."""
+import asyncio
+import base64
+import logging
+import random
+import sys
+
+from .aescipher import AESCipher
+from .connection import checksum
+from .const import HOST, KEY, MACHINE_NAME, MODEL_NAME, PORT, SERIAL_NUMBER
+from .mirror import parse_region
+from .msgs import MODEL_GS3_AV, MSGS, TEMP_COFFEE, TEMP_STEAM, TEMP_REPORT_MAP, Msg
+
+_LOGGER = logging.getLogger(__name__)
+
+MEMORY_SIZE = 0x10000
+
+"""Seconds between unsolicited temperature reports and water flow frames."""
+DEFAULT_TEMP_INTERVAL = 1
+DEFAULT_FLOW_INTERVAL = 0.25
+
+"""Initial memory contents, as ASCII-encoded hex at an address."""
+DEFAULT_MEMORY = {
+    # Config: power on, coffee 93.5C, steam 124.0C, 12s doses, 8s hot water
+    0x0000: "01000000000000" + "03A7" + "04D8" + "00" * 9 + "0078" * 5 + "08",
+    # Status: firmware 1.20, module serial number, coffee 93.5C, steam 124.0C
+    0x4000: "0178" + "02" + b"Sn0000000000".hex() + "00" * 13 + "03A7" + "04D8",
+    0x4022: "01",
+    # Front panel
+    0x60EF: b"  93.5\xdf  124\xdf  ".hex(),
+}
+
+_TEMP_REPORT = MSGS[Msg.GET_TEMP_REPORT]
+_WATER_FLOW = MSGS[Msg.GET_WATER_FLOW]
+
+
+def _temp_address(key):
+    """Return the (address, size) of a temperature."""
+    elem = next(x for x in TEMP_REPORT_MAP if TEMP_REPORT_MAP[x] == key)
+    return _TEMP_REPORT.address + elem.index, elem.size
+
+
+class SimulatedMachine:
+    """Emulates the machine's memory map behind the encrypted local protocol."""
+
+    def __init__(
+        self,
+        key,
+        host="127.0.0.1",
+        port=0,
+        serial_number="GS000000",
+        latency=0,
+        jitter=0,
+        loss=0,
+        garbage=0,
+        temp_interval=DEFAULT_TEMP_INTERVAL,
+        seed=None,
+    ):
+        """latency and jitter are in seconds, loss and garbage are per-frame probabilities."""
+        self._key = key
+        self._cipher = AESCipher(key)
+        self._host = host
+        self._port = port
+        self._serial_number = serial_number
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.garbage = garbage
+        self._temp_interval = temp_interval
+        self._random = random.Random(seed)
+
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+        self._tasks = set()
+
+        """Frames received and sent, for load tests."""
+        self.received = 0
+        self.sent = 0
+
+        self.memory = bytearray(MEMORY_SIZE)
+        for address, data in DEFAULT_MEMORY.items():
+            self.write(address, data)
+        self.write(0x0101, serial_number.encode("latin-1").hex())
+
+    @property
+    def port(self):
+        """Return the port that the machine is listening on."""
+        return self._port
+
+    @property
+    def machine_info(self):
+        """Return the machine info to pass to LMDirect."""
+        return {
+            HOST: self._host,
+            PORT: self._port,
+            KEY: self._key,
+            SERIAL_NUMBER: self._serial_number,
+            MACHINE_NAME: self._serial_number,
+            MODEL_NAME: MODEL_GS3_AV,
+        }
+
+    def read(self, address, length):
+        """Return a region of memory as ASCII-encoded hex."""
+        return self.memory[address : address + length].hex().upper()
+
+    def write(self, address, data):
+        """Store ASCII-encoded hex in memory."""
+        value = bytes.fromhex(data)
+        self.memory[address : address + len(value)] = value
+
+    def set_temps(self, coffee, steam):
+        """Set the current boiler temperatures."""
+        for key, value in [(TEMP_COFFEE, coffee), (TEMP_STEAM, steam)]:
+            address, size = _temp_address(key)
+            self.memory[address : address + size] = round(value * 10).to_bytes(
+                size, "big"
+            )
+
+    async def start(self):
+        """Start listening for connections."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self._host, self._port
+        )
+        self._port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        """Stop listening and drop every connection."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        for task in list(self._tasks):
+            task.cancel()
+
+        """Closing the transports ends the connection handlers."""
+        handlers = list(self._handlers)
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _spawn(self, coro):
+        """Run a task that's cancelled when the machine closes."""
+        task = asyncio.get_event_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _frame(self, plaintext):
+        """Add the check byte, encrypt and wrap a frame."""
+        return b"@" + self._cipher.encrypt(plaintext + checksum(plaintext)) + b"%"
+
+    async def _send(self, writer, plaintext, delay=True):
+        """Send a frame, subject to the configured latency, loss and garbage."""
+        if delay and (self.latency or self.jitter):
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+        if self.loss and self._random.random() < self.loss:
+            return
+
+        if writer.is_closing():
+            return
+
+        if self.garbage and self._random.random() < self.garbage:
+            """Not valid base64, let alone a valid frame."""
+            noise = bytes(self._random.getrandbits(8) for _ in range(16))
+            writer.write(b"@" + base64.b64encode(noise)[:-2] + b"%")
+
+        writer.write(self._frame(plaintext))
+        self.sent += 1
+
+    def _respond(self, plaintext):
+        """Return the response to a frame, or None if it should be ignored."""
+        msg_type = plaintext[0]
+        msg = plaintext[1:9]
+        data = plaintext[9:-2]
+
+        if checksum(plaintext[:-2]) != plaintext[-2:]:
+            _LOGGER.debug(f"Bad check byte: {plaintext}")
+            return None
+
+        try:
+            address, length = parse_region(msg)
+        except ValueError:
+            return None
+
+        if msg_type == Msg.READ:
+            return Msg.READ + msg + self.read(address, length)
+        elif msg_type == Msg.WRITE:
+            try:
+                self.write(address, data[: length * 2])
+            except ValueError:
+                return None
+            return Msg.WRITE + msg + Msg.RESPONSE_GOOD
+
+        return None
+
+    async def _handle_connection(self, reader, writer):
+        """Answer frames from a client until it disconnects."""
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        reporter = (
+            self._spawn(self._report_temps(writer)) if self._temp_interval else None
+        )
+
+        try:
+            while True:
+                try:
+                    encoded_data = await reader.readuntil(separator=b"%")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                try:
+                    plaintext = self._cipher.decrypt(encoded_data[1:-1])
+                except ValueError:
+                    _LOGGER.debug(f"Undecodable frame: {encoded_data}")
+                    continue
+
+                self.received += 1
+                response = self._respond(plaintext)
+                if response is not None:
+                    """Respond in the background so that latency doesn't block reading."""
+                    self._spawn(self._send(writer, response))
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def _report_temps(self, writer):
+        """Send temperature reports while a client is connected."""
+        while True:
+            await asyncio.sleep(self._temp_interval)
+            await self._send(
+                writer,
+                Msg.READ
+                + _TEMP_REPORT.msg
+                + self.read(_TEMP_REPORT.address, _TEMP_REPORT.length),
+                delay=False,
+            )
+
+    def pour(self, key=1, seconds=25, interval=DEFAULT_FLOW_INTERVAL, pulses_per_second=6):
+        """Stream water flow frames to every connected client for a simulated shot."""
+        return self._spawn(self._pour(key, seconds, interval, pulses_per_second))
+
+    async def _pour(self, key, seconds, interval, pulses_per_second):
+        temps = self.read(_TEMP_REPORT.address, _TEMP_REPORT.length)
+        elapsed = 0
+
+        while elapsed <= seconds:
+            """Upper 12 bits are whole seconds, lower 4 bits are sixteenths."""
+            fixed = int(elapsed) << 4 | int((elapsed % 1) * 16)
+            data = (
+                "00" * 12
+                + "%02X" % key
+                + ("01" if elapsed < seconds * 0.8 else "00")
+                + "%04X" % fixed
+                + "%04X" % int(elapsed * pulses_per_second)
+                + temps
+            )
+
+            for writer in list(self._writers):
+                await self._send(writer, Msg.STREAM + _WATER_FLOW.msg + data, delay=False)
+
+            await asyncio.sleep(interval)
+            elapsed += interval
+
+
+class SimulatedFleet:
+    """Many simulated machines in one process."""
+
+    def __init__(self, count, key="0123456789abcdef0123456789abcdef", **kwargs):
+        self._machines = [
+            SimulatedMachine(key, serial_number="GS%06d" % i, **kwargs)
+            for i in range(count)
+        ]
+
+    @property
+    def machines(self):
+        """Return the simulated machines."""
+        return self._machines
+
+    @property
+    def machine_info(self):
+        """Return the machine info for every machine."""
+        return [x.machine_info for x in self._machines]
+
+    async def start(self):
+        """Start every machine."""
+        await asyncio.gather(*[x.start() for x in self._machines])
+        return self
+
+    async def close(self):
+        """Stop every machine."""
+        await asyncio.gather(*[x.close() for x in self._machines])
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+async def _main(key, port):
+    async with SimulatedMachine(key, host="0.0.0.0", port=port) as machine:
+        print(f"Simulating {machine.machine_info}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m lmdirect.simulator <key> [port]")
+        sys.exit(1)
+
+    asyncio.run(_main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1774))
@@ -0,0 +1,171 @@
+"""Compact storage for a machine's state, with one key schema shared by every machine."""
+from collections.abc import MutableMapping
+
+from .const import MACHINE_NAME, MODEL_NAME
+from .decoder import get_key
+from .msgs import (
+    AUTO_BITFIELD_MAP,
+    DRINK_OFFSET_MAP,
+    GATEWAY_DRINK_MAP,
+    HOUR,
+    MIN,
+    MSGS,
+    OFF,
+    ON,
+    TIME,
+    UPDATE_AVAILABLE,
+)
+
+"""Marks a slot that has no value."""
+_MISSING = object()
+
+
+class Schema:
+    """Maps each key to a slot. Keys that aren't known up front get a slot the first time they're set."""
+
+    def __init__(self, keys=()):
+        self._index = {}
+        self._keys = []
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    @property
+    def keys(self):
+        """Return the keys in slot order."""
+        return tuple(self._keys)
+
+    def index(self, key):
+        """Return the slot for a key, or None if it doesn't have one."""
+        return self._index.get(key)
+
+    def add(self, key):
+        """Return the slot for a key, adding one if needed."""
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = len(self._keys)
+            self._keys.append(key)
+        return index
+
+    def key(self, index):
+        """Return the key for a slot."""
+        return self._keys[index]
+
+
+def _known_keys():
+    """Yield every key that decoding the messages can produce."""
+
+    def join(k):
+        if isinstance(k, tuple):
+            """Some of the maps have keys we never store, like the mystery values."""
+            if not all(isinstance(x, str) for x in k):
+                return None
+        return get_key(k)
+
+    yield MACHINE_NAME
+    yield MODEL_NAME
+    yield UPDATE_AVAILABLE
+
+    for cur_msg in MSGS.values():
+        for raw_key in (cur_msg.map or {}).values():
+            key = join(raw_key)
+            if key is not None:
+                yield key
+
+    for raw_key in AUTO_BITFIELD_MAP.values():
+        yield join(raw_key)
+        """The calculated on and off times for each day."""
+        yield join((raw_key[0], ON, TIME))
+        yield join((raw_key[0], OFF, TIME))
+        for item in [ON, OFF]:
+            for unit in [HOUR, MIN]:
+                yield join((raw_key[0], item, unit))
+
+    for raw_key in list(DRINK_OFFSET_MAP.values()) + list(GATEWAY_DRINK_MAP.values()):
+        yield join(raw_key)
+
+
+"""The schema every machine's state shares."""
+SCHEMA = Schema(_known_keys())
+
+
+class State(MutableMapping):
+    """A dict-compatible record that stores values in a list, with the keys kept once in a Schema."""
+
+    __slots__ = ["_schema", "_index", "_values", "_len"]
+
+    def __init__(self, items=(), schema=SCHEMA):
+        self._schema = schema
+        self._index = schema._index
+        self._values = [_MISSING] * len(schema)
+        self._len = 0
+        if items:
+            self.update(items)
+
+    def __getitem__(self, key):
+        try:
+            value = self._values[self._index[key]]
+        except (KeyError, IndexError):
+            raise KeyError(key) from None
+
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        index = self._index.get(key)
+        if index is None:
+            index = self._schema.add(key)
+
+        values = self._values
+        if index >= len(values):
+            """The schema grew after this record was made."""
+            values.extend([_MISSING] * (len(self._schema) - len(values)))
+
+        if values[index] is _MISSING:
+            self._len += 1
+        values[index] = value
+
+    def __delitem__(self, key):
+        self[key]
+        self._values[self._index[key]] = _MISSING
+        self._len -= 1
+
+    def __contains__(self, key):
+        try:
+            return self._values[self._index[key]] is not _MISSING
+        except (KeyError, IndexError):
+            return False
+
+    def __iter__(self):
+        key = self._schema.key
+        for index, value in enumerate(self._values):
+            if value is not _MISSING:
+                yield key(index)
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self.items())})"
+
+    def get(self, key, default=None):
+        try:
+            value = self._values[self._index[key]]
+        except (KeyError, IndexError):
+            return default
+        return default if value is _MISSING else value
+
+    def copy(self):
+        """Return a copy that shares the schema."""
+        state = State.__new__(State)
+        state._schema = self._schema
+        state._index = self._index
+        state._values = self._values.copy()
+        state._len = self._len
+        return state
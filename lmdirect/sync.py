@@ -0,0 +1,179 @@
+"""Blocking interface to LMDirect for code that doesn't run an event loop."""
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import threading
+
+from . import LMDirect
+
+"""Longest a blocking call waits for the machine, in seconds."""
+DEFAULT_CALL_TIMEOUT = 60
+
+
+class SyncLMDirect:
+    """Runs an LMDirect on one long-lived event loop in a background thread.
+
+    The connection, the cloud lookup and the mirror stay warm between calls, and every
+    method can be called from any number of threads. Callbacks run on the loop's thread.
+    """
+
+    def __init__(self, machine_info, timeout=DEFAULT_CALL_TIMEOUT):
+        self._timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run, name="lmdirect", daemon=True
+        )
+        self._thread.start()
+
+        async def create():
+            return LMDirect(machine_info)
+
+        """Create it on the loop so that its locks and futures belong there."""
+        self._lmdirect = self._call(create())
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _check_thread(self):
+        if threading.current_thread() is self._thread:
+            raise RuntimeError(
+                "Blocking calls can't be made from the event loop's thread, use the LMDirect instead"
+            )
+        if self._loop.is_closed():
+            raise RuntimeError("Client is closed")
+
+    def _call(self, coro, timeout=None):
+        """Run a coroutine on the loop and wait for its result."""
+        try:
+            self._check_thread()
+        except RuntimeError:
+            coro.close()
+            raise
+
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(self._timeout if timeout is None else timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def _call_soon(self, fn, *args):
+        """Run a plain function on the loop and wait for its result."""
+        self._check_thread()
+
+        future = concurrent.futures.Future()
+
+        def call():
+            try:
+                future.set_result(fn(*args))
+            except Exception as err:
+                future.set_exception(err)
+
+        self._loop.call_soon_threadsafe(call)
+        return future.result(self._timeout)
+
+    @property
+    def lmdirect(self):
+        """Return the LMDirect, for use from the loop's thread."""
+        return self._lmdirect
+
+    @property
+    def loop(self):
+        """Return the event loop the LMDirect runs on."""
+        return self._loop
+
+    """Snapshots are replaced rather than modified, so they can be read from any thread."""
+
+    @property
+    def current_status(self):
+        return self._lmdirect.current_status
+
+    @property
+    def snapshot(self):
+        return self._lmdirect.snapshot
+
+    @property
+    def version(self):
+        return self._lmdirect.version
+
+    def changed_since(self, version):
+        return self._lmdirect.changed_since(version)
+
+    def changes_since(self, version):
+        return self._call_soon(self._lmdirect.changes_since, version)
+
+    @property
+    def machine_name(self):
+        return self._lmdirect.machine_name
+
+    @property
+    def serial_number(self):
+        return self._lmdirect.serial_number
+
+    @property
+    def model_name(self):
+        return self._lmdirect.model_name
+
+    @property
+    def firmware_version(self):
+        return self._lmdirect.firmware_version
+
+    def register_callback(self, callback):
+        self._call_soon(self._lmdirect.register_callback, callback)
+
+    def register_change_callback(self, callback):
+        self._call_soon(self._lmdirect.register_change_callback, callback)
+
+    def deregister_change_callback(self, callback):
+        self._call_soon(self._lmdirect.deregister_change_callback, callback)
+
+    def close(self):
+        """Close the connection and stop the loop."""
+        if self._loop.is_closed():
+            return
+
+        async def close():
+            """Drop the connection rather than waiting for the machine to."""
+            await self._lmdirect._close()
+            await self._lmdirect.close()
+
+        try:
+            self._call(close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _blocking(name):
+    """Return a blocking version of an LMDirect coroutine method."""
+    method = getattr(LMDirect, name)
+
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        return self._call(getattr(self._lmdirect, name)(*args, **kwargs))
+
+    return call
+
+
+"""Blocking versions of the requests and every set_* service."""
+for _name, _method in inspect.getmembers(LMDirect, inspect.iscoroutinefunction):
+    if _name.startswith("set_") or _name in [
+        "connect",
+        "request_status",
+        "refresh",
+        "read_memory",
+        "send_msg",
+        "apply_profile",
+    ]:
+        setattr(SyncLMDirect, _name, _blocking(_name))
+
+del _name, _method
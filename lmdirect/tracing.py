@@ -0,0 +1,125 @@
+"""Per-request trace events and a sampling span recorder."""
+import json
+import random
+
+"""Events, in the order they happen for a request."""
+CONNECT_START = "connect_start"
+CONNECT_END = "connect_end"
+FRAME_ENCODED = "frame_encoded"
+FRAME_WRITTEN = "frame_written"
+FRAME_RECEIVED = "frame_received"
+FRAME_DECRYPTED = "frame_decrypted"
+FRAME_DECODED = "frame_decoded"
+CALLBACKS_DISPATCHED = "callbacks_dispatched"
+
+DEFAULT_SAMPLE_RATE = 0.01
+
+"""Spans that never see a response are dropped once there are this many."""
+MAX_OPEN_SPANS = 1000
+
+
+class Tracer:
+    """Receives trace events. The default does nothing and Connection skips it entirely."""
+
+    enabled = False
+
+    def event(self, name, timestamp, msg_id=None, msg=None, **attrs):
+        """Handle an event. timestamp is time.monotonic()."""
+
+
+NULL_TRACER = Tracer()
+
+
+class SamplingRecorder(Tracer):
+    """Collects the events for a sample of requests into spans and writes them to a file as JSON lines."""
+
+    enabled = True
+
+    def __init__(self, path, rate=DEFAULT_SAMPLE_RATE, seed=None):
+        self._file = open(path, "a")
+        self._rate = rate
+        self._random = random.Random(seed)
+
+        """Open spans keyed by message, and the frame being received."""
+        self._spans = {}
+        self._connect = None
+        self._inbound = None
+        self._last_span = None
+        self.written = 0
+
+    def _sampled(self):
+        return self._random.random() < self._rate
+
+    def _write(self, span):
+        if "duration" not in span:
+            times = [x[1] for x in span["events"]]
+            span["duration"] = max(times) - min(times)
+        self._file.write(json.dumps(span) + "\n")
+        self.written += 1
+
+    def event(self, name, timestamp, msg_id=None, msg=None, **attrs):
+        if name == CONNECT_START:
+            self._connect = (
+                {"span": "connect", "events": [(name, timestamp)]}
+                if self._sampled()
+                else None
+            )
+        elif name == CONNECT_END:
+            if self._connect is not None:
+                self._connect["events"].append((name, timestamp))
+                self._connect.update(attrs)
+                self._write(self._connect)
+                self._connect = None
+        elif name == FRAME_ENCODED:
+            if self._sampled():
+                if len(self._spans) >= MAX_OPEN_SPANS:
+                    self._spans.clear()
+                self._spans[msg] = {
+                    "span": "request",
+                    "msg_id": msg_id,
+                    "msg": msg,
+                    "events": [(name, timestamp)],
+                }
+        elif name == FRAME_WRITTEN:
+            span = self._spans.get(msg)
+            if span is not None:
+                span["events"].append((name, timestamp))
+        elif name == FRAME_RECEIVED:
+            self._inbound = timestamp
+        elif name == FRAME_DECRYPTED:
+            span = self._spans.pop(msg, None)
+            if span is None and self._sampled():
+                """Unsolicited frames, like temperature reports, get their own span."""
+                span = {"span": "inbound", "msg_id": msg_id, "msg": msg, "events": []}
+
+            if span is not None:
+                if self._inbound is not None:
+                    span["events"].append((FRAME_RECEIVED, self._inbound))
+                span["events"].append((name, timestamp))
+            self._last_span = span
+            self._inbound = None
+        elif name == FRAME_DECODED:
+            span = self._last_span
+            if span is not None:
+                span["msg_id"] = span["msg_id"] or msg_id
+                span["events"].append((name, timestamp))
+                self._write(span)
+            self._last_span = None
+        elif name == CALLBACKS_DISPATCHED:
+            if self._sampled():
+                self._write(
+                    {
+                        "span": "callbacks",
+                        "events": [(name, timestamp)],
+                        "duration": attrs.get("duration", 0),
+                    }
+                )
+
+    def flush(self):
+        """Write out any buffered spans."""
+        self._file.flush()
+
+    def close(self):
+        """Close the file."""
+        if not self._file.closed:
+            self._file.close()
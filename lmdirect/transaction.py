@@ -0,0 +1,250 @@
+"""Batched setting changes for the local La Marzocco API."""
+import asyncio
+import logging
+from collections import ChainMap, namedtuple
+
+from .mirror import format_region
+from .msgs import GLOBAL, Msg
+
+_LOGGER = logging.getLogger(__name__)
+
+"""Largest region that we'll write in a single frame."""
+MAX_WRITE_LENGTH = 0x20
+
+"""How long to wait for the machine to acknowledge a batch of writes."""
+DEFAULT_TIMEOUT = 5
+
+"""Result of a single merged write. ok is None if the machine didn't respond in time."""
+WriteResult = namedtuple("WriteResult", ["address", "length", "data", "ok"])
+
+
+class Change:
+    """The writes and state updates that make up a single setting change."""
+
+    def __init__(self, msg_id, writes, updates=None, entity_types=None, days=None):
+        """Writes are (address, ASCII-encoded hex data) tuples."""
+        self.msg_id = msg_id
+        self.writes = writes
+        self.updates = updates or {}
+        self.entity_types = entity_types or []
+        self.days = days or []
+
+
+def merge_writes(writes, max_length=MAX_WRITE_LENGTH):
+    """Merge writes to contiguous addresses into as few (address, data) writes as possible."""
+
+    """Later writes to the same address win."""
+    memory = {}
+    for address, data in writes:
+        for i, value in enumerate(bytes.fromhex(data)):
+            memory[address + i] = value
+
+    merged = []
+    start = None
+    buffer = bytearray()
+
+    for address in sorted(memory):
+        if start is not None and (
+            address != start + len(buffer) or len(buffer) >= max_length
+        ):
+            merged.append((start, buffer.hex().upper()))
+            start = None
+
+        if start is None:
+            start = address
+            buffer = bytearray()
+
+        buffer.append(memory[address])
+
+    if start is not None:
+        merged.append((start, buffer.hex().upper()))
+
+    return merged
+
+
+class Transaction:
+    """Collects setting changes and sends them as a single burst of merged writes."""
+
+    def __init__(self, lmdirect, max_length=MAX_WRITE_LENGTH, timeout=DEFAULT_TIMEOUT):
+        self._lmdirect = lmdirect
+        self._max_length = max_length
+        self._timeout = timeout
+        self._changes = []
+        self._pending = {}
+
+        """Later changes see the values set by earlier ones."""
+        self._status = ChainMap(self._pending, lmdirect._current_status)
+
+        self._results = None
+
+    @property
+    def changes(self):
+        """Return the changes collected so far."""
+        return self._changes
+
+    @property
+    def results(self):
+        """Return the per-write results once the transaction has been committed."""
+        return self._results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.commit()
+
+    @property
+    def status(self):
+        """Return the current values with the changes collected so far applied."""
+        return self._status
+
+    def get(self, key, default=None):
+        """Return a value as it will be once the changes collected so far are committed."""
+        return self._status.get(key, default)
+
+    def add(self, change):
+        """Record a change."""
+        self._changes.append(change)
+        self._pending.update(change.updates)
+        return self
+
+    """Settings"""
+
+    def set_power(self, power):
+        return self.add(self._lmdirect._build_power(power))
+
+    def set_auto_on_off_enable(self, day_of_week=None, enable=None):
+        return self.add(
+            self._lmdirect._build_auto_on_off_enable(
+                day_of_week, enable, status=self._status
+            )
+        )
+
+    def set_auto_on_off_global(self, value):
+        return self.add(
+            self._lmdirect._build_auto_on_off_enable(
+                GLOBAL, value, status=self._status
+            )
+        )
+
+    def set_auto_on_off_times(
+        self,
+        day_of_week=None,
+        hour_on=None,
+        minute_on=None,
+        hour_off=None,
+        minute_off=None,
+    ):
+        return self.add(
+            self._lmdirect._build_auto_on_off_times(
+                day_of_week, hour_on, minute_on, hour_off, minute_off
+            )
+        )
+
+    def set_dose(self, key=None, pulses=None):
+        return self.add(self._lmdirect._build_dose(key, pulses))
+
+    def set_dose_hot_water(self, seconds=None):
+        return self.add(self._lmdirect._build_dose_hot_water(seconds))
+
+    def set_prebrew_times(self, key=None, seconds_on=None, seconds_off=None):
+        return self.add(
+            self._lmdirect._build_prebrew_times(key, seconds_on, seconds_off)
+        )
+
+    def set_preinfusion_time(self, key=None, seconds=None):
+        return self.add(self._lmdirect._build_preinfusion_time(key, seconds))
+
+    def set_coffee_temp(self, temp=None):
+        return self.add(self._lmdirect._build_coffee_temp(temp))
+
+    def set_steam_temp(self, temp=None):
+        return self.add(self._lmdirect._build_steam_temp(temp))
+
+    def set_prebrewing_enable(self, enable):
+        return self.add(self._lmdirect._build_prebrewing_enable(enable))
+
+    def set_preinfusion_enable(self, enable):
+        return self.add(self._lmdirect._build_preinfusion_enable(enable))
+
+    def set_steam_boiler_enable(self, enable):
+        return self.add(self._lmdirect._build_steam_boiler_enable(enable))
+
+    """Commit"""
+
+    async def commit(self):
+        """Send all of the collected changes and return a WriteResult for each merged write."""
+        if self._results is not None:
+            return self._results
+
+        lmdirect = self._lmdirect
+        writes = merge_writes(
+            [x for change in self._changes for x in change.writes], self._max_length
+        )
+
+        if not writes:
+            self._results = []
+            return self._results
+
+        """Hold the service locks so that single calls can't interleave with us."""
+        locks = [lmdirect._locks[x] for x in sorted({y.msg_id for y in self._changes})]
+        for lock in locks:
+            await lock.acquire()
+
+        try:
+            frames = [
+                (format_region(address, len(data) // 2), Msg.WRITE, data)
+                for address, data in writes
+            ]
+            futures = [lmdirect._expect_response(Msg.WRITE, x[0]) for x in frames]
+
+            _LOGGER.debug(
+                f"Committing {len(self._changes)} changes in {len(frames)} writes"
+            )
+            try:
+                await lmdirect._send_raw_msgs(frames)
+            except Exception:
+                for future in futures:
+                    lmdirect._cancel_response(future)
+                raise
+
+            await asyncio.wait(futures, timeout=self._timeout)
+            self._results = [
+                WriteResult(address, len(data) // 2, data, future.result())
+                if future.done()
+                else WriteResult(address, len(data) // 2, data, None)
+                for (address, data), future in zip(writes, futures)
+            ]
+
+            for future in futures:
+                if not future.done():
+                    lmdirect._cancel_response(future)
+
+            """Only reflect changes whose writes were all acknowledged."""
+            committed = [
+                change
+                for change in self._changes
+                if all(self._acknowledged(x) for x in change.writes)
+            ]
+            if committed:
+                """Re-read each merged region once to confirm every change in it."""
+                lmdirect._commit_changes(
+                    committed,
+                    [(x.address, x.data) for x in self._results if x.ok],
+                )
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        return self._results
+
+    def _acknowledged(self, write):
+        """Check whether the merged write covering a single write succeeded."""
+        address, data = write
+        end = address + len(data) // 2
+        return all(
+            x.ok
+            for x in self._results
+            if x.address < end and x.address + x.length > address
+        )
@@ -1,61 +1,156 @@
-import json, codecs, re, logging
+import codecs, itertools, json, logging, re, sys
+from concurrent.futures import ProcessPoolExecutor
+
 from lmdirect.aescipher import AESCipher
+from lmdirect.decoder import decode, find_msg_id
+from lmdirect.msgs import MSGS
 
 _LOGGER = logging.getLogger(__name__)
-_LOGGER.setLevel(logging.DEBUG)
 
 PHONE_IP = "192.168.1.150"
 LM_IP = "192.168.1.215"
 CONFIG_FILE = "config.json"
 
-try:
-    with open(CONFIG_FILE) as config_file:
-        data = json.load(config_file)
+SOURCE_MAP = {PHONE_IP: "App", LM_IP: "Machine"}
+
+"""Bytes read from the capture at a time."""
+CHUNK_SIZE = 1 << 20
+
+"""Packets handed to the pool at a time, and packets per task."""
+BATCH_SIZE = 4096
+TASK_SIZE = 256
+
+"""Set in each worker by _init_worker."""
+cipher = None
+
+
+def _init_worker(key):
+    global cipher
+    cipher = AESCipher(key)
+
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    """Yield the items of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+
+    while True:
+        chunk = f.read(chunk_size)
+        buffer += chunk
+        pos = 0
 
-        key = data["key"]
-        filename = data["filename"]
-except Exception as err:
-    print(err)
-    exit(1)
+        while True:
+            """Skip whitespace and the separators between items."""
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
 
-cipher = AESCipher(key)
+            if not started:
+                if pos == len(buffer):
+                    break
+                if buffer[pos] != "[":
+                    raise ValueError("Capture isn't a JSON array")
+                started = True
+                pos += 1
+                continue
 
-SOURCE_MAP = {PHONE_IP: "\nApp", LM_IP: "Machine"}
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
 
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                """The item continues in the next chunk."""
+                if not chunk:
+                    raise
+                break
 
-def checksum(buffer):
-    """Compute check byte"""
-    buffer = bytes(buffer, "utf-8")
-    return "%0.2X" % (sum(buffer) % 256)
+            if chunk and (end == len(buffer) or buffer[end] not in " \t\r\n,]"):
+                """A number could be cut off at the end of the chunk."""
+                break
 
+            pos = end
+            yield item
 
-# Opening JSON file
-with open(filename) as json_file:
-    data = json.load(json_file)
+        """Only keep the part we haven't consumed yet."""
+        buffer = buffer[pos:]
 
-    print(f"Parsing {filename}")
+        if not chunk:
+            return
 
-    for item in data:
+
+def _parse(numbered_item):
+    """Decrypt and decode a single packet. Runs in a worker."""
+    frame, item = numbered_item
+
+    try:
         layers = item["_source"]["layers"]
         ip_src = layers["ip"]["ip.src"]
-
+        packet_data = layers["data"]["data.data"].replace(":", "")
+    except KeyError:
+        return None
+
+    decoded_data = codecs.decode(packet_data, "hex").decode("utf-8")
+    ciphertext = re.sub("[@%]", "", decoded_data)
+    plaintext = cipher.decrypt(ciphertext)
+
+    msg_type = plaintext[0]
+    msg = plaintext[1:9]
+    msg_id = find_msg_id(msg_type, msg)
+
+    result = {
+        "frame": frame,
+        "source": SOURCE_MAP.get(ip_src, ip_src),
+        "type": msg_type,
+        "msg": msg,
+        "msg_id": msg_id,
+    }
+
+    cur_msg = MSGS[msg_id] if msg_id is not None else None
+    if cur_msg is not None and cur_msg.map is not None:
         try:
-            packet_data = layers["data"]["data.data"].replace(":", "")
-            decoded_data = codecs.decode(packet_data, "hex").decode("utf-8")
-            _LOGGER.debug("Parsed: {}".format(decoded_data))
-            ciphertext = re.sub("[@%]", "", decoded_data)
+            result["fields"] = decode(cur_msg, plaintext[9:-2])
+        except ValueError:
+            result["data"] = plaintext[9:-2]
+    else:
+        result["data"] = plaintext[9:-2]
+
+    return result
+
+
+def main(argv):
+    try:
+        with open(CONFIG_FILE) as config_file:
+            data = json.load(config_file)
+
+            key = data["key"]
+            filename = data["filename"]
+    except Exception as err:
+        print(err)
+        exit(1)
+
+    """Usage: python parse.py [capture file] [workers]"""
+    if len(argv) > 1:
+        filename = argv[1]
+    workers = int(argv[2]) if len(argv) > 2 else None
+
+    print(f"Parsing {filename}", file=sys.stderr)
 
-            plaintext = cipher.decrypt(ciphertext)
-            _LOGGER.debug(plaintext)
-            # plaintest = plaintext.partition(b'\0')[0].decode('utf-8')
+    with open(filename) as json_file, ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(key,)
+    ) as executor:
+        items = enumerate(iter_json_array(json_file))
 
-            print("{}: {} ".format(SOURCE_MAP[ip_src], plaintext[0]), end="")
+        """Hand the pool a bounded batch at a time so memory doesn't grow with the capture."""
+        while True:
+            batch = list(itertools.islice(items, BATCH_SIZE))
+            if not batch:
+                break
 
-            for i in range(1, len(plaintext), 2):
-                chars = plaintext[i : i + 2]
-                print(chars, end=" ")
+            for result in executor.map(_parse, batch, chunksize=TASK_SIZE):
+                if result is not None:
+                    print(json.dumps(result, ensure_ascii=False))
 
-            print("")
 
-        except KeyError:
-            pass
+if __name__ == "__main__":
+    main(sys.argv)
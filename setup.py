@@ -24,6 +24,7 @@ setuptools.setup(
     ],
     packages=setuptools.find_packages(),
     install_requires=["pycryptodome>=3.9.9", "httpx>=0.16.1", "authlib>=0.15.5,<1.*"],
+    extras_require={"numpy": ["numpy>=1.19"]},
     package_data={
         "license": ["LICENSE"],
     },
@@ -133,17 +133,7 @@ class lmtest:
                         await self.lmdirect._send_raw_msg(args[1], Msg.READ)
                 elif args[0] == "11":
                     if check_args(2):
-                        await asyncio.gather(
-                            *[
-                                self.lmdirect._send_raw_msg(
-                                    args[1]
-                                    + self.lmdirect._convert_to_ascii(i, 1)
-                                    + "0010",
-                                    Msg.READ,
-                                )
-                                for i in range(0, 0xFF, 0x10)
-                            ]
-                        )
+                        await self.lmdirect.read_memory(int(args[1], 16) << 8, 0x100)
                 elif args[0] == "12":
                     if check_args(3):
                         await self.lmdirect.set_auto_on_off_hours(
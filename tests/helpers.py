@@ -0,0 +1,24 @@
+"""Shared helpers for tests against a SimulatedMachine."""
+import time
+
+"""The key that the simulated machines and the clients share."""
+KEY = "0123456789abcdef0123456789abcdef"
+
+
+def record(machine):
+    """Start recording (time, frame) for every frame the machine receives, without the check byte."""
+    frames = []
+    respond = machine._respond
+
+    def spy(plaintext):
+        frames.append((time.monotonic(), plaintext[:-2]))
+        return respond(plaintext)
+
+    machine._respond = spy
+    return frames
+
+
+async def close(lmdirect):
+    """Drop the connection rather than waiting for the machine to, then close."""
+    await lmdirect._close()
+    await lmdirect.close()
@@ -0,0 +1,53 @@
+"""Every value that changes is reported to change callbacks and versioned."""
+import asyncio
+
+from lmdirect import LMDirect
+from lmdirect.msgs import MSGS, Msg
+from lmdirect.simulator import SimulatedMachine
+
+from .helpers import KEY, close
+
+AUTO_SCHED = MSGS[Msg.GET_AUTO_ON_OFF_TIMES]
+
+
+def test_schedule_times_are_reported_as_changes():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            events = []
+            lmdirect.register_change_callback(events.append)
+
+            await lmdirect.refresh([Msg.GET_AUTO_ON_OFF_TIMES])
+            assert events[-1]["mon_on_time"] == "00:00"
+
+            """Monday on at 06:30, changed at the machine."""
+            machine.write(AUTO_SCHED.address + 1, "06")
+            machine.write(AUTO_SCHED.address + 15, "1E")
+            await lmdirect.refresh([Msg.GET_AUTO_ON_OFF_TIMES], max_age=0)
+            assert events[-1]["mon_on_time"] == "06:30"
+
+            await lmdirect.set_auto_on_off_times("mon", 7, 15, 18, 0)
+            assert events[-1]["mon_on_time"] == "07:15"
+            assert events[-1]["mon_off_time"] == "18:00"
+
+            await close(lmdirect)
+
+    asyncio.run(run())
+
+
+def test_changes_since_includes_schedule_times():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            await lmdirect.refresh([Msg.GET_AUTO_ON_OFF_TIMES])
+            version = lmdirect.version
+
+            await lmdirect.set_auto_on_off_times("mon", 7, 15, 18, 0)
+            changes = lmdirect.changes_since(version)
+            assert changes["mon_on_time"] == "07:15"
+            assert changes["mon_off_time"] == "18:00"
+            assert changes["mon_on_time"] == lmdirect.snapshot.status["mon_on_time"]
+
+            await close(lmdirect)
+
+    asyncio.run(run())
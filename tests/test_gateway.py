@@ -0,0 +1,58 @@
+"""The gateway only calls services, and answers malformed requests."""
+import asyncio
+import json
+
+from lmdirect import LMDirect
+from lmdirect.gateway import Gateway
+from lmdirect.simulator import SimulatedMachine
+from lmdirect.tracing import NULL_TRACER
+
+from .helpers import KEY, close
+
+
+async def request(port, method, path, body=b"", length=None):
+    """Return the status and JSON payload of a request."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    length = len(body) if length is None else length
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {length}\r\nConnection: close\r\n\r\n".encode()
+        + body
+    )
+    data = await reader.read()
+    writer.close()
+
+    head, _, payload = data.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload) if payload else None
+
+
+def test_only_services_can_be_called():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            async with Gateway({"m": lmdirect}, host="127.0.0.1", port=0) as gateway:
+                status, _ = await request(
+                    gateway.port, "POST", "/machines/m/set_tracer", b'{"tracer": "x"}'
+                )
+                assert status == 404
+                assert lmdirect._tracer is NULL_TRACER
+
+                status, payload = await request(
+                    gateway.port, "POST", "/machines/m/set_coffee_temp", b'{"temp": 94}'
+                )
+                assert (status, payload) == (200, {"ok": True})
+
+            await close(lmdirect)
+
+    asyncio.run(run())
+
+
+def test_invalid_content_length_is_rejected():
+    async def run():
+        async with Gateway({}, host="127.0.0.1", port=0) as gateway:
+            for length in ["x", "-1"]:
+                status, _ = await request(
+                    gateway.port, "POST", "/machines", length=length
+                )
+                assert status == 400
+
+    asyncio.run(run())
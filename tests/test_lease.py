@@ -0,0 +1,45 @@
+"""Lease mode batches work into short connection windows."""
+import asyncio
+
+from lmdirect import LMDirect
+from lmdirect.metrics import CONNECTS
+from lmdirect.msgs import MSGS, Msg
+from lmdirect.simulator import SimulatedMachine
+
+from .helpers import KEY, close, record
+
+
+def test_lease_window_flushes_and_disconnects():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None, latency=0.01) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            lmdirect.lease_period = 0.1
+            frames = record(machine)
+
+            read = asyncio.create_task(
+                lmdirect.refresh([Msg.GET_CONFIG], max_age=0)
+            )
+            await asyncio.sleep(0.01)
+            write = asyncio.create_task(lmdirect.set_coffee_temp(temp=94))
+
+            """Nothing is sent until the window opens."""
+            await asyncio.sleep(0.05)
+            assert not frames
+            assert not lmdirect._connected
+
+            assert await read
+            await write
+            await asyncio.sleep(0.02)
+
+            """Everything went out in one window, writes first, and the connection was dropped."""
+            assert lmdirect.metrics.counter(CONNECTS) == 1
+            assert not lmdirect._connected
+            assert [x[1][:9] for x in frames[:2]] == [
+                Msg.WRITE + MSGS[Msg.SET_COFFEE_TEMP].msg,
+                Msg.READ + MSGS[Msg.GET_CONFIG].msg,
+            ]
+            assert machine.read(MSGS[Msg.SET_COFFEE_TEMP].address, 2) == "03AC"
+
+            await close(lmdirect)
+
+    asyncio.run(run())
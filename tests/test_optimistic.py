@@ -0,0 +1,66 @@
+"""Written values are shown until the machine confirms or rejects them."""
+import asyncio
+
+from lmdirect import LMDirect
+from lmdirect.metrics import CONFLICTS
+from lmdirect.mirror import format_region
+from lmdirect.msgs import TSET_COFFEE, Msg
+from lmdirect.optimistic import Conflict
+from lmdirect.simulator import SimulatedMachine
+
+from .helpers import KEY, close, record
+
+
+def test_rejected_write_reports_a_conflict():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            conflicts = []
+            lmdirect.register_conflict_callback(conflicts.append)
+            await lmdirect.request_status()
+            await asyncio.sleep(0.05)
+            assert lmdirect.current_status[TSET_COFFEE] == 93.5
+
+            respond = machine._respond
+
+            def reject(plaintext):
+                """Answer every write with something other than OK."""
+                if plaintext[0] == Msg.WRITE:
+                    return Msg.WRITE + plaintext[1:9] + "NO"
+                return respond(plaintext)
+
+            machine._respond = reject
+
+            await lmdirect.set_coffee_temp(temp=96)
+            await asyncio.sleep(0.1)
+            await close(lmdirect)
+
+        assert conflicts == [{TSET_COFFEE: Conflict(96, 93.5)}]
+        assert lmdirect.metrics.counter(CONFLICTS) == 1
+        assert lmdirect.current_status[TSET_COFFEE] == 93.5
+
+    asyncio.run(run())
+
+
+def test_merged_writes_are_confirmed_with_one_read():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            await lmdirect.refresh([Msg.GET_CONFIG])
+            frames = record(machine)
+
+            async with lmdirect.transaction() as txn:
+                for key in range(1, 5):
+                    txn.set_dose(key=key, pulses=100 + key)
+            await asyncio.sleep(0.1)
+            await close(lmdirect)
+
+        """The rest of the settings' message may be read too, so that it can be decoded."""
+        [write] = txn.results
+        region = format_region(write.address, write.length)
+        reads = [x[1][1:9] for x in frames if x[1][0] == Msg.READ]
+        assert reads.count(region) == 1
+        assert len(reads) == len(set(reads))
+        assert lmdirect.current_status["dose_k4"] == 104
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+"""Writes are pipelined unless they overlap one that hasn't been acknowledged."""
+import asyncio
+
+from lmdirect import LMDirect, connection
+from lmdirect.msgs import MSGS, Msg
+from lmdirect.simulator import SimulatedMachine
+
+from .helpers import KEY, close, record
+
+LATENCY = 0.05
+
+
+def test_overlapping_writes_go_out_one_after_the_other():
+    async def run():
+        async with SimulatedMachine(
+            KEY, temp_interval=None, latency=LATENCY
+        ) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            await lmdirect.connect()
+            frames = record(machine)
+
+            await asyncio.gather(
+                lmdirect.set_coffee_temp(temp=93),
+                lmdirect.set_steam_temp(temp=120),
+                lmdirect.set_coffee_temp(temp=94),
+            )
+            await asyncio.sleep(LATENCY * 2)
+            await close(lmdirect)
+
+        writes = [x for x in frames if x[1][0] == Msg.WRITE]
+        coffee = Msg.WRITE + MSGS[Msg.SET_COFFEE_TEMP].msg
+        steam = Msg.WRITE + MSGS[Msg.SET_STEAM_TEMP].msg
+        assert [x[1][:9] for x in writes] == [coffee, steam, coffee]
+
+        """The steam write didn't wait, but the second coffee write waited for the first's response."""
+        assert writes[1][0] - writes[0][0] < LATENCY / 2
+        assert writes[2][0] - writes[0][0] >= LATENCY
+        assert machine.read(MSGS[Msg.SET_COFFEE_TEMP].address, 2) == "03AC"
+
+    asyncio.run(run())
+
+
+def test_overlapping_write_waits_out_a_lease_window(monkeypatch):
+    monkeypatch.setattr(connection, "DEFAULT_RESPONSE_TIMEOUT", 0.05)
+
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            lmdirect.lease_period = 0.2
+            msg = MSGS[Msg.SET_COFFEE_TEMP].msg
+
+            """A write that's been sent but not answered yet."""
+            lmdirect._track_writes([(msg, Msg.WRITE, "03A7")])
+            wait = asyncio.create_task(
+                lmdirect._wait_for_overlapping_writes([(msg, Msg.WRITE, "03AC")])
+            )
+
+            """Longer than the response timeout, but within the lease period."""
+            await asyncio.sleep(0.1)
+            assert not wait.done()
+
+            lmdirect._acknowledge_write(msg, True)
+            await asyncio.wait_for(wait, 0.05)
+            await close(lmdirect)
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+"""The proxy answers each client's reads once, and only broadcasts unsolicited frames."""
+import asyncio
+
+from lmdirect import LMDirect
+from lmdirect.msgs import MSGS, Msg
+from lmdirect.proxy import Proxy
+from lmdirect.simulator import SimulatedMachine
+
+from .helpers import KEY, close
+
+TEMP_REPORT = Msg.READ + MSGS[Msg.GET_TEMP_REPORT].msg
+
+
+async def lines(reader, timeout=0.2):
+    """Return the lines a plain client receives until it goes quiet."""
+    received = []
+    while True:
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+        except asyncio.TimeoutError:
+            return received
+        received.append(line.decode("latin-1").strip())
+
+
+def test_each_client_gets_one_reply():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            async with Proxy(
+                lmdirect, host="127.0.0.1", port=0, plain_port=0
+            ) as proxy:
+                clients = [
+                    await asyncio.open_connection("127.0.0.1", proxy.plain_port)
+                    for _ in range(2)
+                ]
+                await asyncio.sleep(0.05)
+
+                for _, writer in clients:
+                    writer.write(TEMP_REPORT.encode() + b"\n")
+                    await writer.drain()
+                    """Let the first read reach the machine before the second one asks."""
+                    await asyncio.sleep(0.05)
+
+                received = [await lines(reader) for reader, _ in clients]
+                for _, writer in clients:
+                    writer.close()
+
+            await close(lmdirect)
+
+        for replies in received:
+            assert len(replies) == 1
+            assert replies[0].startswith(TEMP_REPORT)
+
+    asyncio.run(run())
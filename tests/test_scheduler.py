@@ -0,0 +1,71 @@
+"""Writes go ahead of polls, but not for so long that polls starve."""
+import asyncio
+
+from lmdirect import LMDirect
+from lmdirect.mirror import format_region
+from lmdirect.msgs import MSGS, Msg
+from lmdirect.scheduler import PRIORITY_WRITE, SendScheduler
+from lmdirect.simulator import SimulatedMachine
+
+from .helpers import KEY, close, record
+
+WRITE = Msg.WRITE + MSGS[Msg.SET_COFFEE_TEMP].msg
+
+"""Regions that nothing else reads."""
+POLLS = range(0x1000, 0x1040, 0x10)
+
+
+def test_writes_go_ahead_of_waiting_polls():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            await lmdirect.connect()
+            frames = record(machine)
+
+            """Hold the turn so that everything queues up behind it."""
+            async with lmdirect._scheduler.turn(PRIORITY_WRITE):
+                polls = [
+                    asyncio.create_task(lmdirect.read_memory(x, 0x10, max_age=0))
+                    for x in POLLS
+                ]
+                await asyncio.sleep(0.01)
+                write = asyncio.create_task(lmdirect.set_coffee_temp(temp=94))
+                await asyncio.sleep(0.01)
+
+            await asyncio.gather(write, *polls)
+            await asyncio.sleep(0.05)
+            await close(lmdirect)
+
+        """Reading back the written value comes after these."""
+        received = [x[1] for x in frames][:5]
+        assert received[0].startswith(WRITE)
+        assert received[1:] == [Msg.READ + format_region(x, 0x10) for x in POLLS]
+
+    asyncio.run(run())
+
+
+def test_poll_that_waited_too_long_goes_next():
+    async def run():
+        async with SimulatedMachine(KEY, temp_interval=None) as machine:
+            lmdirect = LMDirect(machine.machine_info)
+            lmdirect._scheduler = SendScheduler(max_poll_delay=0.05)
+            await lmdirect.connect()
+            frames = record(machine)
+
+            async with lmdirect._scheduler.turn(PRIORITY_WRITE):
+                poll = asyncio.create_task(
+                    lmdirect.read_memory(0x1000, 0x10, max_age=0)
+                )
+                await asyncio.sleep(0.1)
+                write = asyncio.create_task(lmdirect.set_coffee_temp(temp=94))
+                await asyncio.sleep(0.01)
+
+            await asyncio.gather(write, poll)
+            await asyncio.sleep(0.05)
+            await close(lmdirect)
+
+        received = [x[1] for x in frames]
+        assert received[0] == Msg.READ + format_region(0x1000, 0x10)
+        assert received[1].startswith(WRITE)
+
+    asyncio.run(run())